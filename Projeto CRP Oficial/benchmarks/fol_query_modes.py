@@ -0,0 +1,81 @@
+"""Compares the FOLKB query modes on StrategicGhost-style knowledge bases.
+
+Each KB has the four move rules of StrategicGhost and per-cell facts
+(Safe, NotDeadEnd/DeadEnd, Visited/NotVisited, CloseToPacman, Closer) for
+a growing number of cells. A turn asks the four move queries on a freshly
+built KB; the times cover the queries (including the bottom-up
+materialization of the datalog mode) but not telling the clauses.
+
+Run from the project root:
+    python -m benchmarks.fol_query_modes
+"""
+import random
+import time
+
+from src.logic.first_order import FOLKB, Predicate, Variable, Constant
+
+
+RULES = [
+    ("BestMove", ["Safe", "CloseToPacman", "Closer"]),
+    ("ExploreMove", ["Safe", "NotDeadEnd", "NotVisited"]),
+    ("GoodMove", ["Safe", "NotDeadEnd"]),
+    ("PossibleMove", ["Safe"]),
+]
+
+
+def build_kb(mode, facts):
+    kb = FOLKB(mode=mode)
+    for fact in facts:
+        kb.tell((fact, []))
+    m = Variable("m")
+    for head, body in RULES:
+        kb.tell((Predicate(head, [m]), [Predicate(name, [m]) for name in body]))
+    return kb
+
+
+def make_facts(n_cells, rng):
+    facts = []
+    for i in range(n_cells):
+        cell = Constant((i, 0))
+        facts.append(Predicate("Safe", [cell]))
+        facts.append(Predicate("NotDeadEnd" if rng.random() < 0.7 else "DeadEnd", [cell]))
+        facts.append(Predicate("NotVisited" if rng.random() < 0.5 else "Visited", [cell]))
+        if rng.random() < 0.3:
+            facts.append(Predicate("CloseToPacman", [cell]))
+        if rng.random() < 0.5:
+            facts.append(Predicate("Closer", [cell]))
+    return facts
+
+
+def run_turn(kb):
+    answers = 0
+    for head, _ in RULES:
+        answers += len(list(kb.ask(Predicate(head, [Variable("m")]))))
+    return answers
+
+
+def time_turn(mode, facts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        kb = build_kb(mode, facts)
+        start = time.perf_counter()
+        answers = run_turn(kb)
+        best = min(best, time.perf_counter() - start)
+    return best, answers
+
+
+def main(sizes=(4, 16, 64, 256, 1024), repeat=5, seed=0):
+    rng = random.Random(seed)
+    modes = FOLKB.MODES
+    print(f"{'cells':>6} {'facts':>6} " + " ".join(f"{m + ' (ms)':>14}" for m in modes))
+    for n in sizes:
+        facts = make_facts(n, rng)
+        results = [time_turn(mode, facts, repeat) for mode in modes]
+        # Every mode must agree on the number of answers
+        assert len({answers for _, answers in results}) == 1
+        print(f"{n:>6} {len(facts):>6} " +
+              " ".join(f"{seconds * 1000:>14.2f}" for seconds, _ in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -19,8 +19,18 @@ except ImportError:
     print("Erro ao importar fantasma FOL.")
     pass
 
+from src.logic.instrumentation import InferenceStats, record
+from src.world.grid import Grid, GridView
+from src.world.visibility import VisibilityTable
+from src.world.distance import DistanceOracle, FlowField
+from src.world.maze import build_maze
+
 Coord = Tuple[int, int]
 
+# Até este número de células, todas as distâncias do labirinto são
+# pré-calculadas; acima dele os campos de distância são calculados a pedido
+ALL_PAIRS_MAX_CELLS = 400
+
 
 def get_pressed_key() -> str:
     """Verifica se uma tecla de seta ou 'q' foi pressionada.
@@ -91,17 +101,33 @@ class Environment:
         h: int,
         walls: Set[Coord] = None,
         pellets: Set[Coord] = None,
-        start_pos: Coord = (0, 0)
+        start_pos: Coord = (0, 0),
+        grid: Grid = None
     ):
         self.w, self.h = w, h
-        self.walls: Set[Coord] = set(walls or set())
-        self.pellets: Set[Coord] = set(pellets or set())
+        # Paredes e pastilhas ficam em arrays (ver src/world/grid.py): as
+        # consultas por célula não constroem nem fazem hash de tuplos.
+        # Uma grelha já construída (p.ex. por build_maze) é usada tal como está
+        if grid is not None and (grid.w, grid.h) != (w, h):
+            raise ValueError(f"Grid size {grid.w}x{grid.h} does not match {w}x{h}")
+        self.grid = grid if grid is not None else Grid(w, h, walls or (), pellets or ())
+        # Campos de visão (linha de visão) por raio, calculados por célula
+        # na primeira consulta e reutilizados enquanto as paredes não mudam
+        self.visibility: Dict[int, VisibilityTable] = {}
+        # Distâncias no labirinto (BFS), partilhadas por todos os fantasmas
+        self.distances = DistanceOracle(self.grid, all_pairs=(w * h <= ALL_PAIRS_MAX_CELLS))
         self.pacman_pos: Coord = start_pos
         self.time: int = 0
         self.finished: bool = False
         self.won: bool = False
         self.ghosts: List = [] # Lista para manter os agentes fantasmas
         self.lives: int = 3
+
+        # Instrumentação da inferência: quando ativa, cada decisão de cada
+        # fantasma é medida e os contadores do último tick ficam em tick_stats
+        self.instrument: bool = False
+        self.capture_proofs: bool = False
+        self.tick_stats: Dict[str, InferenceStats] = {}
         
         # Posições iniciais dos fantasmas (lógica simples: cantos ou locais específicos)
         # Por enquanto, podemos gerá-los ou apenas escolher espaços vazios
@@ -116,11 +142,21 @@ class Environment:
             rx = random.randint(0, self.w - 1)
             ry = random.randint(0, self.h - 1)
             pos = (rx, ry)
-            if pos not in self.walls and pos != self.pacman_pos:
+            if not self.grid.is_wall(rx, ry) and pos != self.pacman_pos:
                 ghost.set_position(pos)
                 self.ghost_starts.append(pos)
                 break
 
+    @property
+    def walls(self) -> Set[Coord]:
+        """Conjunto das paredes (cópia construída a partir da grelha)."""
+        return self.grid.walls()
+
+    @property
+    def pellets(self) -> Set[Coord]:
+        """Conjunto das pastilhas restantes (cópia construída a partir da grelha)."""
+        return self.grid.pellets()
+
     def in_bounds(self, c: Coord) -> bool:
         """Retorna True se a coordenada c estiver dentro dos limites da grelha."""
         x, y = c
@@ -128,42 +164,74 @@ class Environment:
 
     def blocked(self, c: Coord) -> bool:
         """Retorna True se a coordenada c estiver bloqueada por paredes ou limites."""
-        return (not self.in_bounds(c)) or (c in self.walls)
+        return self.grid.blocked(c[0], c[1])
 
     # --- Métodos de compatibilidade para Agentes Fantasmas (imitando a classe Grid) ---
     def is_in_bounds(self, x: int, y: int) -> bool:
-        return self.in_bounds((x, y))
+        return 0 <= x < self.w and 0 <= y < self.h
 
     def is_wall(self, x: int, y: int) -> bool:
-        return (x, y) in self.walls
-
-    def get_view(self, x: int, y: int, radius: int = 4) -> Dict[Coord, str]:
+        return self.grid.is_wall(x, y)
+
+    def neighbors(self, x: int, y: int) -> List[Coord]:
+        """Vizinhos livres (4-conectados) de (x, y)."""
+        return self.grid.neighbors(x, y)
+
+    def flow_field(self, target: Coord) -> FlowField:
+        """Campo de fluxo (distâncias e próximo passo) em direção a target,
+        partilhado por todos os fantasmas que perseguem o mesmo alvo."""
+        return self.distances.field(*target)
+
+    def ghost_within(self, pos: Coord, limit: int) -> bool:
+        """True se algum fantasma estiver a menos de limit passos de pos
+        no labirinto. O BFS pára ao fim de limit - 1 passos, por isso não
+        percorre o mapa todo como um campo de fluxo."""
+        grid = self.grid
+        ghosts = {grid.index(*ghost.position) for ghost in self.ghosts
+                  if grid.in_bounds(*ghost.position)}
+        start = grid.index(*pos)
+        if start in ghosts:
+            return True
+        neighbors = grid.neighbor_table()
+        seen = {start}
+        frontier = [start]
+        for _ in range(limit - 1):
+            next_frontier = []
+            for i in frontier:
+                for j in neighbors[i]:
+                    if j not in seen:
+                        if j in ghosts:
+                            return True
+                        seen.add(j)
+                        next_frontier.append(j)
+            frontier = next_frontier
+        return False
+
+    def maze_distance(self, a: Coord, b: Coord):
+        """Número de passos de a até b contornando paredes, ou None se b
+        não for alcançável a partir de a."""
+        return self.distances.distance(a, b)
+
+    def get_view(self, x: int, y: int, radius: int = 4) -> GridView:
         """
         Retorna uma visão da grelha ao redor de (x, y) para o fantasma.
-        Retorna um dicionário: {(nx, ny): 'Wall' ou 'Empty'}
+        A visão é uma janela só de leitura sobre o array da grelha (nada é
+        copiado) e comporta-se como o antigo dicionário
+        {(nx, ny): 'Wall' ou 'Empty'}.
         """
-        view = {}
-        # Raio quadrado simples ou linha de visão. 
-        # A lógica original parecia esperar um dicionário de células visíveis.
-        # Vamos fornecer uma área quadrada ao redor do fantasma.
-        for dy in range(-radius, radius + 1):
-            for dx in range(-radius, radius + 1):
-                nx, ny = x + dx, y + dy
-                if self.is_in_bounds(nx, ny):
-                    # Verificação simples de Linha de Visão poderia ser adicionada aqui se necessário
-                    # Por enquanto, apenas retorna o tipo de célula
-                    if self.is_wall(nx, ny):
-                        view[(nx, ny)] = 'Wall'
-                    else:
-                        view[(nx, ny)] = 'Empty'
-        return view
+        # Área quadrada ao redor do fantasma, recortada aos limites da
+        # grelha e reduzida às células em linha de visão (shadowcasting)
+        table = self.visibility.get(radius)
+        if table is None:
+            table = self.visibility[radius] = VisibilityTable(self.grid, radius)
+        return table.view(x, y)
     # -------------------------------------------------------------------
 
     def sense(self) -> Dict:
         """Retorna um dicionário de percepção descrevendo o estado atual."""
         return dict(
             pos=self.pacman_pos,
-            pellet_here=(self.pacman_pos in self.pellets),
+            pellet_here=self.grid.has_pellet(*self.pacman_pos),
             time=self.time,
             finished=self.finished
         )
@@ -185,12 +253,11 @@ class Environment:
                 self.pacman_pos = (nx, ny)
 
         # Coletar pastilha se necessário
-        if self.pacman_pos in self.pellets:
-            self.pellets.remove(self.pacman_pos)
-            # Pontuação poderia ser adicionada aqui
+        # Pontuação poderia ser adicionada aqui (remove_pellet devolve True se havia pastilha)
+        self.grid.remove_pellet(*self.pacman_pos)
 
         # Verificar condição de vitória
-        if len(self.pellets) == 0:
+        if self.grid.pellet_count == 0:
             self.finished = True
             self.won = True
             return
@@ -202,22 +269,32 @@ class Environment:
         self.check_collisions()
 
     def update_ghosts(self):
+        if self.instrument:
+            self.tick_stats = {}
         for ghost in self.ghosts:
             # Obter percepção
             view = self.get_view(ghost.position[0], ghost.position[1])
             
             # Verificar se o Pacman é visível para o fantasma
-            # Verificação simples: o Pacman está na visão?
+            # A visão já só contém células em linha de visão, por isso
+            # basta consultar o bitset do campo de visão
             pacman_visible_pos = None
             if self.pacman_pos in view:
-                # Verificar Linha de Visão se estritamente necessário, mas por enquanto:
                 pacman_visible_pos = self.pacman_pos
 
             ghost.update(view, pacman_visible_pos)
             
             # Decidir movimento
             # O fantasma espera que 'grid' seja passado. 'self' atua como a grelha.
-            new_pos = ghost.decide_move(self)
+            if self.instrument:
+                stats = InferenceStats(capture_proofs=self.capture_proofs)
+                with record(stats):
+                    new_pos = ghost.decide_move(self)
+                ghost.tick_stats = stats
+                ghost.stats.add(stats)
+                self.tick_stats[ghost.color] = stats
+            else:
+                new_pos = ghost.decide_move(self)
             
             if new_pos:
                 # Validar movimento apenas por precaução
@@ -248,16 +325,9 @@ class Environment:
                 pos = (rx, ry)
                 
                 if not self.blocked(pos):
-                    # Verificar distância de todos os fantasmas
-                    is_safe = True
-                    for ghost in self.ghosts:
-                        gx, gy = ghost.position
-                        dist = abs(rx - gx) + abs(ry - gy) # Distância Manhattan
-                        if dist < safe_distance:
-                            is_safe = False
-                            break
-                    
-                    if is_safe:
+                    # Verificar distância de todos os fantasmas: basta um BFS
+                    # a partir de pos limitado a safe_distance passos
+                    if not self.ghost_within(pos, safe_distance):
                         self.pacman_pos = pos
                         return
                 
@@ -299,12 +369,13 @@ class Environment:
         RESET = '\033[0m'
 
         buf: List[str] = []
-        status_line = f"t={self.time} | pastilhas={len(self.pellets)} | Vidas={self.lives}"
+        status_line = f"t={self.time} | pastilhas={self.grid.pellet_count} | Vidas={self.lives}"
         buf.append(status_line)
 
         # Criar um mapa de posições de fantasmas para consulta rápida
         ghost_map = {g.position: g for g in self.ghosts}
 
+        grid = self.grid
         for y in range(self.h):
             row = []
             for x in range(self.w):
@@ -316,9 +387,9 @@ class Environment:
                     g = ghost_map[c]
                     color_code = COLOR_MAP.get(g.color, GREEN) # Default verde
                     ch = f"{color_code}G{RESET}" 
-                elif c in self.walls:
+                elif grid.is_wall(x, y):
                     ch = f"{BLUE}#{RESET}"
-                elif c in self.pellets:
+                elif grid.has_pellet(x, y):
                     ch = f"{YELLOW}.{RESET}"
                 else:
                     ch = ' '
@@ -338,64 +409,23 @@ def generate_maze(
     w: int,
     h: int,
     wall_density: float = 0.15,
-    pellet_density: float = 0.15
+    pellet_density: float = 0.15,
+    seed=None,
+    style: str = "random"
 ) -> Tuple[Set[Coord], Set[Coord], Coord]:
-    """Gerar paredes, pastilhas e a posição inicial do Pac-Man."""
-    # Adicionar paredes aleatórias
-    rng = random.Random()
-    
-    # Definir paredes de borda
-    border_walls = set()
-    for x in range(w):
-        border_walls.add((x, 0))
-        border_walls.add((x, h - 1))
-    for y in range(h):
-        border_walls.add((0, y))
-        border_walls.add((w - 1, y))
-        
-    # Espaço interno para paredes aleatórias
-    inner_positions = [(x, y) for y in range(1, h - 1) for x in range(1, w - 1)]
-    
-    k_walls = int(wall_density * len(inner_positions))
-    random_walls = set(rng.sample(inner_positions, k_walls)) if k_walls > 0 else set()
-    
-    walls = border_walls.union(random_walls)
-
-    # Garantir que a posição inicial do Pac-Man não contenha uma parede
-    # Vamos escolher uma posição inicial segura
-    pacman_start = (1, 1)
-    if pacman_start in walls:
-        walls.discard(pacman_start)
-    
-    # Identificar células livres
-    all_positions = [(x, y) for y in range(0, h) for x in range(0, w)]
-    free_cells = [c for c in all_positions if c not in walls and c != pacman_start]
-    
-    # 1. Verificar Conectividade (Flood Fill a partir do Pacman)
-    # Para garantir que as pastilhas sejam acessíveis
-    reachable = set()
-    queue = [pacman_start]
-    visited = {pacman_start}
-    
-    while queue:
-        cx, cy = queue.pop(0)
-        reachable.add((cx, cy))
-        
-        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            nx, ny = cx + dx, cy + dy
-            if 0 <= nx < w and 0 <= ny < h and (nx, ny) not in walls and (nx, ny) not in visited:
-                visited.add((nx, ny))
-                queue.append((nx, ny))
-                
-    # 2. Filtrar células para pastilhas
-    # Regra: Deve ser acessível (garantido pelo Flood Fill)
-    valid_pellet_spots = [c for c in free_cells if c in reachable]
-
-    # Colocar pastilhas em espaços válidos
-    k_pellets = max(1, int(pellet_density * len(valid_pellet_spots)))
-    pellets = set(rng.sample(valid_pellet_spots, k_pellets)) if k_pellets > 0 else set()
-
-    return walls, pellets, pacman_start
+    """Gerar paredes, pastilhas e a posição inicial do Pac-Man.
+
+    A geração é feita em arrays por src/world/maze.py: com a mesma seed o
+    labirinto é sempre o mesmo. style escolhe o gerador ('random' para
+    paredes aleatórias, 'backtracker' ou 'braid' para labirintos). Para
+    grelhas muito grandes, usar build_maze e passar a grelha ao Environment
+    evita construir os conjuntos de tuplos."""
+    # As pastilhas só são colocadas em células alcançáveis a partir do
+    # Pac-Man (conectividade por union-find sobre as linhas da grelha)
+    grid, pacman_start = build_maze(w, h, style=style, seed=seed,
+                                    wall_density=wall_density,
+                                    pellet_density=pellet_density)
+    return grid.walls(), grid.pellets(), pacman_start
 
 
 def run_game(
@@ -1,5 +1,6 @@
 from src.agents.ghost import Ghost
 from src.logic.first_order import FOLKB, Predicate, Variable, Constant, fol_bc_ask
+from src.world.corridors import CorridorGraph
 import random
 
 """FOL-based ghost agent.
@@ -45,142 +46,128 @@ class StrategicGhost(Ghost):
     """
     def __init__(self, color="Orange"):
         super().__init__(color)
-        self.kb = FOLKB()
+        # Rules are matched incrementally: each turn only the changed facts
+        # propagate to the move conclusions, and the queries are lookups
+        self.kb = FOLKB(mode="incremental")
         self.visited = set()
+        # Junction graph of the belief map, re-traced only where new cells
+        # are revealed; dead ends and distances are looked up on it
+        self.corridors = CorridorGraph()
+        self.tell_rules()
+
+    def tell_rules(self):
+        v_next = Variable("m")
+
+        # Rule 1: Strategic Move - Not Dead End AND Closer to Pacman (if close)
+        # If Pacman is close, we want to get closer, but avoid dead ends if possible?
+        # Actually, if Pacman is in a dead end, we should go there.
+        # Let's simplify:
+        # If CloseToPacman(m) AND Closer(m) -> BestMove(m)
+        self.kb.tell((Predicate("BestMove", [v_next]), [
+            Predicate("Safe", [v_next]),
+            Predicate("CloseToPacman", [v_next]),
+            Predicate("Closer", [v_next])
+        ]))
+
+        # Rule 2: Explore - Not Dead End AND Not Visited -> ExploreMove(m)
+        self.kb.tell((Predicate("ExploreMove", [v_next]), [
+            Predicate("Safe", [v_next]),
+            Predicate("NotDeadEnd", [v_next]),
+            Predicate("NotVisited", [v_next])
+        ]))
+
+        # Rule 3: Good Move (General) - Not Dead End -> GoodMove(m)
+        self.kb.tell((Predicate("GoodMove", [v_next]), [
+            Predicate("Safe", [v_next]),
+            Predicate("NotDeadEnd", [v_next])
+        ]))
+        
+        # Rule 4: Any Safe Move -> PossibleMove(m)
+        self.kb.tell((Predicate("PossibleMove", [v_next]), [
+            Predicate("Safe", [v_next])
+        ]))
+
+    def graph_distance(self, grid, a, b):
+        dist = self.corridors.distance(a, b)
+        return self.distance(grid, a, b) if dist is None else dist
 
     def decide_move(self, grid):
-        # Transient state: clear clauses but keep agent memory (self.visited)
-        self.kb.clauses = []
+        # Transient state: the facts are rebuilt each turn (agent memory is
+        # kept in self.visited) and synced into the persistent KB
+        facts = []
 
         x, y = self.position
         self.visited.add((x, y))
 
         me = Constant("Me")
-        curr_c = Constant(f"C_{x}_{y}")
+        curr_c = Constant((x, y))
         
         # Fact 1: Current Position
-        self.kb.tell((Predicate("At", [me, curr_c]), []))
+        facts.append(Predicate("At", [me, curr_c]))
 
         neighbors = [(0, -1), (0, 1), (1, 0), (-1, 0)]
         valid_moves = []
-        
-        # Analyze surroundings to detect Dead Ends
-        # A cell is a dead end if it has only 1 valid neighbor (which is where we came from)
-        # But we need to know if the NEIGHBOR is a dead end.
-        
+
+        # A neighbour is a dead end if stepping into it goes deeper into a
+        # branch of the corridor graph that does not loop back
+        corridors = self.corridors
+        corridors.sync(self.belief_map)
+
         for dx, dy in neighbors:
             nx, ny = x + dx, y + dy
-            next_c = Constant(f"C_{nx}_{ny}")
+            next_c = Constant((nx, ny))
             cell_type = self.belief_map.get((nx, ny), 'Unknown')
 
             if cell_type != 'Wall':
                 valid_moves.append((nx, ny))
                 
                 # Fact 2: Connectivity
-                self.kb.tell((Predicate("Connected", [curr_c, next_c]), []))
+                facts.append(Predicate("Connected", [curr_c, next_c]))
                 # Fact 3: Safety
-                self.kb.tell((Predicate("Safe", [next_c]), []))
-                
-                # Check if this neighbor is a Dead End (simplified check: does it have < 2 exits?)
-                # We can't easily check the neighbor's neighbors without querying the grid/belief map deeper.
-                # Let's assume we can query belief map for neighbor's neighbors.
-                n_exits = 0
-                for ndx, ndy in neighbors:
-                    nnx, nny = nx + ndx, ny + ndy
-                    if self.belief_map.get((nnx, nny), 'Unknown') != 'Wall':
-                        n_exits += 1
+                facts.append(Predicate("Safe", [next_c]))
                 
-                if n_exits <= 1:
-                     self.kb.tell((Predicate("DeadEnd", [next_c]), []))
+                if corridors.leads_into_dead_end((x, y), (nx, ny)):
+                     facts.append(Predicate("DeadEnd", [next_c]))
                 else:
-                     self.kb.tell((Predicate("NotDeadEnd", [next_c]), []))
+                     facts.append(Predicate("NotDeadEnd", [next_c]))
 
                 # Fact 4: Visited Status
                 if (nx, ny) in self.visited:
-                    self.kb.tell((Predicate("Visited", [next_c]), []))
+                    facts.append(Predicate("Visited", [next_c]))
                 else:
-                    self.kb.tell((Predicate("NotVisited", [next_c]), []))
+                    facts.append(Predicate("NotVisited", [next_c]))
             
             # Fact 5 (Pacman perception)
             if self.last_known_pacman_pos:
                 px, py = self.last_known_pacman_pos
                 
-                # Distance logic
-                dist = abs(px - nx) + abs(py - ny)
+                # Distance logic (maze distance over the believed corridors,
+                # or the shared BFS field when the belief has no path)
+                dist = self.graph_distance(grid, (nx, ny), (px, py))
                 
                 if dist < 8:
-                    self.kb.tell((Predicate("CloseToPacman", [next_c]), []))
+                    facts.append(Predicate("CloseToPacman", [next_c]))
                 
-                if dist < abs(px - x) + abs(py - y):
-                     self.kb.tell((Predicate("Closer", [next_c]), []))
+                if dist < self.graph_distance(grid, (x, y), (px, py)):
+                     facts.append(Predicate("Closer", [next_c]))
 
-        # 2. Add Rules
-        v_next = Variable("m")
-
-        # Rule 1: Strategic Move - Not Dead End AND Closer to Pacman (if close)
-        # If Pacman is close, we want to get closer, but avoid dead ends if possible?
-        # Actually, if Pacman is in a dead end, we should go there.
-        # Let's simplify:
-        # If CloseToPacman(m) AND Closer(m) -> BestMove(m)
-        self.kb.tell((Predicate("BestMove", [v_next]), [
-            Predicate("Safe", [v_next]),
-            Predicate("CloseToPacman", [v_next]),
-            Predicate("Closer", [v_next])
-        ]))
-
-        # Rule 2: Explore - Not Dead End AND Not Visited -> ExploreMove(m)
-        self.kb.tell((Predicate("ExploreMove", [v_next]), [
-            Predicate("Safe", [v_next]),
-            Predicate("NotDeadEnd", [v_next]),
-            Predicate("NotVisited", [v_next])
-        ]))
-
-        # Rule 3: Good Move (General) - Not Dead End -> GoodMove(m)
-        self.kb.tell((Predicate("GoodMove", [v_next]), [
-            Predicate("Safe", [v_next]),
-            Predicate("NotDeadEnd", [v_next])
-        ]))
-        
-        # Rule 4: Any Safe Move -> PossibleMove(m)
-        self.kb.tell((Predicate("PossibleMove", [v_next]), [
-            Predicate("Safe", [v_next])
-        ]))
+        # 2. Rules were told once in tell_rules(); only the facts that
+        # differ from the previous turn are told/retracted
+        self.kb.sync_facts(facts)
 
         # 3. Decide
         # Priority 1: BestMove
-        query = Predicate("BestMove", [Variable("m")])
-        results = list(self.kb.ask(query))
-        if results:
-            choice = results[0][Variable("m")]
-            parts = choice.name.split('_')
-            return (int(parts[1]), int(parts[2]))
+        answer = self.kb.ask_first(Predicate("BestMove", [Variable("m")]))
+        if answer:
+            return answer[Variable("m")].value
 
         # Priority 2: ExploreMove (Unvisited & Not Dead End)
-        query = Predicate("ExploreMove", [Variable("m")])
-        results = list(self.kb.ask(query))
-        if results:
-            import random
-            choice = random.choice(results)[Variable("m")]
-            parts = choice.name.split('_')
-            return (int(parts[1]), int(parts[2]))
-
         # Priority 3: GoodMove (Avoid Dead Ends, but maybe visited)
-        query = Predicate("GoodMove", [Variable("m")])
-        results = list(self.kb.ask(query))
-        if results:
-            # Pick random good move
-            import random
-            choice = random.choice(results)[Variable("m")]
-            parts = choice.name.split('_')
-            return (int(parts[1]), int(parts[2]))
-
         # Priority 4: PossibleMove (Fallback)
-        query = Predicate("PossibleMove", [Variable("m")])
-        results = list(self.kb.ask(query))
-        if results:
-            import random
-            choice = random.choice(results)[Variable("m")]
-            parts = choice.name.split('_')
-            return (int(parts[1]), int(parts[2]))
-
-        return None
\ No newline at end of file
+        # Each one picks a random move among its answers
+        for name in ("ExploreMove", "GoodMove", "PossibleMove"):
+            answer = self.kb.ask_random(Predicate(name, [Variable("m")]))
+            if answer:
+                return answer[Variable("m")].value
+
+        return None
@@ -1,15 +1,22 @@
 import random
 
+from src.logic.instrumentation import InferenceStats
+from src.world.belief import BeliefMap
+
 class Ghost:
     def __init__(self, color="Red"):
         self.position = (0, 0)
         self.color = color
         self.last_known_pacman_pos = None
-        # Belief map: (x,y) -> 'Wall'|'Empty'|'Unknown'
-        self.belief_map = {}
+        # Belief map: (x,y) -> 'Wall'|'Empty'|'Unknown' (array-backed, dict-like)
+        self.belief_map = BeliefMap()
         self.visited = set()
         # Possible Pacman locations (coarse tracking)
         self.possible_pacman_locations = set()
+        # Inference counters: accumulated over the game, and for the last tick
+        # (filled in by the environment when instrumentation is on)
+        self.stats = InferenceStats()
+        self.tick_stats = None
 
     def set_position(self, pos):
         self.position = pos
@@ -18,27 +25,21 @@ class Ghost:
 
     def update(self, view, pacman_pos):
         """
-        view: dict of {(x,y): 'Wall'/'Empty'} currently visible
+        view: GridView (or dict) of {(x,y): 'Wall'/'Empty'} currently visible
         pacman_pos: (x,y) if visible, else None
         """
-        # Update belief map with what we see
-        for pos, cell_type in view.items():
-            self.belief_map[pos] = cell_type
-            if cell_type == 'Empty':
-                # If we see an empty cell and Pacman is NOT there, remove from possible
-                if pos != pacman_pos:
-                    self.possible_pacman_locations.discard(pos)
-                else:
-                    # If we see Pacman, he is definitely here
-                    self.possible_pacman_locations = {pos}
-        
+        # Update belief map with what we see (copied row by row)
+        self.belief_map.merge(view)
+
         if pacman_pos:
             self.last_known_pacman_pos = pacman_pos
             # If we see him, we know exactly where he is
             self.possible_pacman_locations = {pacman_pos}
-        else:
-            # Pacman not visible: keep last_known_pacman_pos and basic possible set
-            pass
+        elif self.possible_pacman_locations:
+            # Pacman not visible: every empty cell we see rules him out there
+            self.possible_pacman_locations = {
+                pos for pos in self.possible_pacman_locations
+                if not (pos in view and view[pos] == 'Empty')}
 
     def decide_move(self, grid):
         """
@@ -46,11 +47,15 @@ class Ghost:
         """
         raise NotImplementedError
 
+    def distance(self, grid, a, b):
+        """Maze distance from a to b, read from the flow field toward b
+        that the grid shares between ghosts. Falls back to Manhattan
+        distance when b cannot be reached from a."""
+        d = grid.flow_field(b).distance(*a) if grid.is_in_bounds(*b) else None
+        if d is None:
+            return abs(a[0] - b[0]) + abs(a[1] - b[1])
+        return d
+
     def get_valid_moves(self, grid):
-        x, y = self.position
-        moves = []
-        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            nx, ny = x + dx, y + dy
-            if grid.is_in_bounds(nx, ny) and not grid.is_wall(nx, ny):
-                moves.append((nx, ny))
-        return moves
+        # The grid keeps a precomputed table of free neighbours per cell
+        return grid.neighbors(*self.position)
@@ -1,12 +1,25 @@
 from src.agents.ghost import Ghost
-from src.logic.propositional import PropositionalKB, Symbol, And, Or, Not, Implication
+from src.logic.propositional import PropositionalKB, DecisionTable, Symbol, And, Or, Not, Implication
 import random
 
 
 class PropGhost(Ghost):
+    DIRS = {'North': (0, -1), 'South': (0, 1), 'East': (1, 0), 'West': (-1, 0)}
+
     def __init__(self, color="Red"):
         super().__init__(color)
         self.kb = PropositionalKB()
+        # Rules persist in the KB; each turn only the named facts are updated
+        self.tell_rules()
+        # The answers for every fact combination seen so far are memoized,
+        # so a repeated situation costs one lookup instead of an inference
+        self.decisions = DecisionTable(self.kb, self.queries())
+
+    def tell_rules(self):
+        pass
+
+    def queries(self):
+        return []
 
     def update(self, view, pacman_pos):
         super().update(view, pacman_pos)
@@ -22,10 +35,25 @@ class StalkerGhost(PropGhost):
     - If Pacman is NOT Visible but Last Known Position exists -> Go to Last Known.
     - If Lost -> Explore/Search.
     """
+    def tell_rules(self):
+        # Rule 1: Chase - If Pacman is in direction D and D is safe, then BestMoveD
+        for d in self.DIRS:
+            self.kb.tell(Implication(
+                And(Symbol(f"Pacman{d}"), Symbol(f"{d}Safe")), 
+                Symbol(f"BestMove{d}")
+            ))
+
+        # Rule 2: Explore - If D is Safe, it is a ValidMoveD
+        for d in self.DIRS:
+            self.kb.tell(Implication(Symbol(f"{d}Safe"), Symbol(f"ValidMove{d}")))
+
+    def queries(self):
+        return ([Symbol(f"BestMove{d}") for d in self.DIRS] +
+                [Symbol(f"ValidMove{d}") for d in self.DIRS])
+
     def decide_move(self, grid):
-        self.kb.retract_all() # Clears KB from previous turn
         x, y = self.position
-        dirs = {'North': (0, -1), 'South': (0, 1), 'East': (1, 0), 'West': (-1, 0)}
+        dirs = self.DIRS
         
         # Get valid moves based on BELIEF MAP (not just immediate grid, though they should match for adjacent)
         # We use the grid object passed in only to check bounds/walls for immediate execution safety,
@@ -33,14 +61,15 @@ class StalkerGhost(PropGhost):
         valid_moves = self.get_valid_moves(grid)
         
         # 1. Add facts (atomic propositions)
+        facts = {}
         for d_name, (dx, dy) in dirs.items():
             nx, ny = x + dx, y + dy
             
             # Fact: {D}Safe
             if (nx, ny) in valid_moves:
-                self.kb.tell(Symbol(f"{d_name}Safe"))
+                facts[f"{d_name}Safe"] = Symbol(f"{d_name}Safe")
             else:
-                self.kb.tell(Not(Symbol(f"{d_name}Safe")))
+                facts[f"{d_name}Safe"] = Not(Symbol(f"{d_name}Safe"))
 
             # Fact: Pacman{D} (Directional sensing)
             # We use self.last_known_pacman_pos which is updated by update()
@@ -48,39 +77,35 @@ class StalkerGhost(PropGhost):
                 px, py = self.last_known_pacman_pos
                 
                 # Check if this direction is the BEST step towards the target
-                # We can use a simple distance check or BFS on belief map
-                dist_current = abs(px - x) + abs(py - y)
-                dist_new = abs(px - nx) + abs(py - ny)
+                # Maze distances come from the shared BFS field of the target
+                dist_current = self.distance(grid, (x, y), (px, py))
+                dist_new = self.distance(grid, (nx, ny), (px, py))
                 
                 if dist_new < dist_current:
-                     self.kb.tell(Symbol(f"Pacman{d_name}"))
+                     facts[f"Pacman{d_name}"] = Symbol(f"Pacman{d_name}")
                 else:
-                     self.kb.tell(Not(Symbol(f"Pacman{d_name}")))
-
-        # 2. Add rules
-        # Rule 1: Chase - If Pacman is in direction D and D is safe, then BestMoveD
-        for d in dirs:
-            self.kb.tell(Implication(
-                And(Symbol(f"Pacman{d}"), Symbol(f"{d}Safe")), 
-                Symbol(f"BestMove{d}")
-            ))
+                     facts[f"Pacman{d_name}"] = Not(Symbol(f"Pacman{d_name}"))
+            else:
+                facts[f"Pacman{d_name}"] = None
 
-        # Rule 2: Explore - If D is Safe, it is a ValidMoveD
-        for d in dirs:
-            self.kb.tell(Implication(Symbol(f"{d}Safe"), Symbol(f"ValidMove{d}")))
+        # 2. Rules were told once in tell_rules()
 
         # 3. Decide movement
         best_moves = []
         valid_moves_list = []
         
+        # All eight queries are answered from a single inference run,
+        # or from the decision table if this situation was seen before
+        answers = self.decisions.lookup(facts)
+
         # Check for BestMove (Chase)
         for d, (dx, dy) in dirs.items():
-            if self.kb.ask(Symbol(f"BestMove{d}")):
+            if answers[Symbol(f"BestMove{d}")]:
                 best_moves.append((dx, dy))
         
         # Check for ValidMove (Fallback)
         for d, (dx, dy) in dirs.items():
-            if self.kb.ask(Symbol(f"ValidMove{d}")):
+            if answers[Symbol(f"ValidMove{d}")]:
                 valid_moves_list.append((dx, dy))
 
         # Execute Decision
@@ -109,10 +134,25 @@ class AmbushGhost(PropGhost):
         super().__init__(color)
         self.last_move = None
 
+    def tell_rules(self):
+        # Rule: If Safe and ToTarget -> AmbushMove
+        for d in self.DIRS:
+            self.kb.tell(Implication(
+                And(Symbol(f"{d}Safe"), Symbol(f"ToTarget{d}")),
+                Symbol(f"AmbushMove{d}")
+            ))
+            
+        # Rule: If Safe -> PossibleMove (Fallback)
+        for d in self.DIRS:
+            self.kb.tell(Implication(Symbol(f"{d}Safe"), Symbol(f"PossibleMove{d}")))
+
+    def queries(self):
+        return ([Symbol(f"AmbushMove{d}") for d in self.DIRS] +
+                [Symbol(f"PossibleMove{d}") for d in self.DIRS])
+
     def decide_move(self, grid):
-        self.kb.retract_all()
         x, y = self.position
-        dirs = {'North': (0, -1), 'South': (0, 1), 'East': (1, 0), 'West': (-1, 0)}
+        dirs = self.DIRS
         valid_moves = self.get_valid_moves(grid)
 
         # 1. Determine Target
@@ -136,44 +176,41 @@ class AmbushGhost(PropGhost):
             target_x, target_y = px, py
 
         # 2. Add Facts
+        facts = {}
         for d_name, (dx, dy) in dirs.items():
             nx, ny = x + dx, y + dy
             
             if (nx, ny) in valid_moves:
-                self.kb.tell(Symbol(f"{d_name}Safe"))
+                facts[f"{d_name}Safe"] = Symbol(f"{d_name}Safe")
             else:
-                self.kb.tell(Not(Symbol(f"{d_name}Safe")))
+                facts[f"{d_name}Safe"] = Not(Symbol(f"{d_name}Safe"))
 
             # Direction to Target
-            # Check if this direction reduces distance to Target
-            dist_current = abs(target_x - x) + abs(target_y - y)
-            dist_new = abs(target_x - nx) + abs(target_y - ny)
+            # Check if this direction reduces (maze) distance to Target.
+            # Without a target (our own cell) no move can, and no field is needed
+            if (target_x, target_y) != (x, y):
+                dist_current = self.distance(grid, (x, y), (target_x, target_y))
+                dist_new = self.distance(grid, (nx, ny), (target_x, target_y))
+            else:
+                dist_current = dist_new = 0
             
             if dist_new < dist_current:
-                self.kb.tell(Symbol(f"ToTarget{d_name}"))
+                facts[f"ToTarget{d_name}"] = Symbol(f"ToTarget{d_name}")
             else:
-                self.kb.tell(Not(Symbol(f"ToTarget{d_name}")))
+                facts[f"ToTarget{d_name}"] = Not(Symbol(f"ToTarget{d_name}"))
 
-        # 3. Add Rules
-        # Rule: If Safe and ToTarget -> AmbushMove
-        for d in dirs:
-            self.kb.tell(Implication(
-                And(Symbol(f"{d}Safe"), Symbol(f"ToTarget{d}")),
-                Symbol(f"AmbushMove{d}")
-            ))
-            
-        # Rule: If Safe -> PossibleMove (Fallback)
-        for d in dirs:
-            self.kb.tell(Implication(Symbol(f"{d}Safe"), Symbol(f"PossibleMove{d}")))
+        # 3. Rules were told once in tell_rules()
 
         # 4. Decide
         ambush_moves = []
         possible_moves = []
         
+        answers = self.decisions.lookup(facts)
+
         for d, (dx, dy) in dirs.items():
-            if self.kb.ask(Symbol(f"AmbushMove{d}")):
+            if answers[Symbol(f"AmbushMove{d}")]:
                 ambush_moves.append((dx, dy))
-            if self.kb.ask(Symbol(f"PossibleMove{d}")):
+            if answers[Symbol(f"PossibleMove{d}")]:
                 possible_moves.append((dx, dy))
                 
         if ambush_moves:
@@ -1,122 +1,991 @@
+import heapq
+import itertools
+import random
+
+from src.logic import instrumentation
+from src.logic.instrumentation import ProofNode
+
+class SymbolTable:
+    """Interns constant payloads and predicate names to small integer IDs.
+
+    Payloads can be any hashable value (strings, cell tuples, ints) and are
+    told apart by type as well as by ==, so True, 1 and 1.0 (or (True, 0)
+    and (1, 0)) get different IDs."""
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        key = value if type(value) is str else _typed_key(value)
+        symbol = self.ids.get(key)
+        if symbol is None:
+            symbol = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return symbol
+
+    def value(self, symbol):
+        return self.values[symbol]
+
+    def __len__(self):
+        return len(self.values)
+
+def _typed_key(value):
+    # The value with the type of every (nested) element attached
+    if isinstance(value, tuple):
+        return (type(value), tuple(_typed_key(v) for v in value))
+    return (type(value), value)
+
+symbols = SymbolTable()
+_predicate_keys = {}      # one shared (symbol, arity) tuple per predicate
+
 class Expr:
-    pass
+    __slots__ = ()
 
 class Variable(Expr):
+    __slots__ = ('name', '_hash')
+
     def __init__(self, name):
         self.name = name
+        self._hash = hash(name)
     
     def __repr__(self):
         return f"?{self.name}"
     
     def __eq__(self, other):
-        return isinstance(other, Variable) and self.name == other.name
+        return self is other or (isinstance(other, Variable) and self.name == other.name)
     
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
 class Constant(Expr):
-    def __init__(self, name):
-        self.name = name
-    
+    """A constant, interned: there is one instance per payload, so equality
+    and hashing are by identity. The payload is kept in value, e.g.
+    Constant("Me") or Constant((3, 4)) for a grid cell."""
+    __slots__ = ('value', 'id')
+    _instances = {}
+
+    def __new__(cls, value):
+        symbol = symbols.intern(value)
+        constant = Constant._instances.get(symbol)
+        if constant is None:
+            constant = object.__new__(cls)
+            constant.value = value
+            constant.id = symbol
+            Constant._instances[symbol] = constant
+        return constant
+
+    @property
+    def name(self):
+        return self.value if isinstance(self.value, str) else repr(self.value)
+
     def __repr__(self):
         return self.name
-    
-    def __eq__(self, other):
-        return isinstance(other, Constant) and self.name == other.name
-    
-    def __hash__(self):
-        return hash(self.name)
+
+    def __reduce__(self):
+        return (Constant, (self.value,))
 
 class Predicate(Expr):
+    """An atom. The name is interned to symbol, args are kept as a tuple,
+    and key = (symbol, arity) is what the KB indexes by; the hash is
+    computed once."""
+    __slots__ = ('name', 'args', 'symbol', 'key', '_hash')
+
     def __init__(self, name, args):
         self.name = name
-        self.args = args
+        self.args = tuple(args)
+        self.symbol = symbols.intern(name)
+        key = (self.symbol, len(self.args))
+        self.key = _predicate_keys.setdefault(key, key)
+        self._hash = hash((self.symbol, self.args))
+
+    def with_args(self, args):
+        """The same predicate applied to args (of the same arity)."""
+        atom = object.__new__(type(self))
+        atom.name = self.name
+        atom.args = tuple(args)
+        atom.symbol = self.symbol
+        atom.key = self.key
+        atom._hash = hash((self.symbol, atom.args))
+        return atom
     
     def __repr__(self):
         return f"{self.name}({', '.join(map(str, self.args))})"
     
     def __eq__(self, other):
-        return (isinstance(other, Predicate) and 
-                self.name == other.name and 
-                len(self.args) == len(other.args) and 
-                all(a == b for a, b in zip(self.args, other.args)))
+        return self is other or (isinstance(other, Predicate) and
+                                 self._hash == other._hash and
+                                 self.symbol == other.symbol and
+                                 self.args == other.args)
     
     def __hash__(self):
-        return hash(self.name) ^ hash(tuple(self.args))
+        return self._hash
+
+class CompiledClause:
+    """A clause prepared once when it is told.
+
+    The variables are collected up front so renaming apart is a single
+    pass, ground clauses (facts) are never renamed, and the constants of
+    the head allow rejecting a goal before anything is built."""
+    def __init__(self, head, body):
+        self.head = head
+        self.body = body
+        self.variables = []
+        for p in [head] + list(body):
+            _collect_variables(p, self.variables)
+        self.ground = not self.variables
+        self.head_constants = [a if isinstance(a, Constant) else None for a in head.args]
+
+    def may_match(self, args):
+        # args: the goal's arguments, already dereferenced
+        for c, g in zip(self.head_constants, args):
+            if c is not None and isinstance(g, Constant) and c != g:
+                return False
+        return True
+
+    def rename(self, suffix):
+        """(head, body) with every variable renamed apart using suffix."""
+        mapping = {v: Variable(f"{v.name}_{suffix}") for v in self.variables}
+        return _rename(self.head, mapping), [_rename(p, mapping) for p in self.body]
+
+def _collect_variables(expr, out):
+    if isinstance(expr, Variable):
+        if expr not in out:
+            out.append(expr)
+    elif isinstance(expr, Predicate):
+        for arg in expr.args:
+            _collect_variables(arg, out)
+
+def _rename(expr, mapping):
+    if isinstance(expr, Variable):
+        return mapping.get(expr, expr)
+    elif isinstance(expr, Predicate):
+        return expr.with_args([_rename(arg, mapping) for arg in expr.args])
+    return expr
 
 class FOLKB:
-    def __init__(self):
-        self.clauses = [] # List of (head, body) where head is Predicate, body is list of Predicates
+    # Query modes accepted by ask(): 'sld' is plain backward chaining,
+    # 'tabled' memoizes answers per variant subgoal (see TableSession),
+    # 'datalog' materializes every consequence bottom-up (see DatalogModel)
+    # and 'incremental' keeps that materialization up to date as facts are
+    # told and retracted (see MatchNetwork).
+    MODES = ('sld', 'tabled', 'datalog', 'incremental')
+
+    def __init__(self, mode='sld'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown query mode: {mode}")
+        self.mode = mode
+        self.clear()
+
+    def clear(self):
+        self.tables = None
+        self.model = None
+        self.network = None
+        self._clauses = {} # Position -> (head, body) where head is Predicate, body is list of Predicates
         # Facts are clauses with empty body
+        self._positions = {}
+        self._next_position = 0
+        # Clauses are indexed by (name, arity) of their head and, when the
+        # first head argument is a constant, by that constant as well.
+        # Entries are (position, clause) so candidates keep tell order.
+        self.by_predicate = {}
+        self.by_first_arg = {}
+        self.var_first_arg = {}
+
+    @property
+    def clauses(self):
+        return list(self._clauses.values())
 
     def tell(self, sentence):
         # Sentence assumed to be Implication(body, head) or just Predicate (fact)
         # Simplified: We expect input as (Head, [Body...])
         # But to make it easier to use, let's accept objects
-        if isinstance(sentence, Predicate):
-            self.clauses.append((sentence, []))
-        elif isinstance(sentence, tuple) and len(sentence) == 2:
-            self.clauses.append(sentence)
+        clause = _as_clause(sentence)
+        # Checked before anything changes, so a rejected clause leaves the
+        # KB and the network in step
+        if self._incremental():
+            _check_clause(*clause)
+        self.tables = None
+        self.model = None
+        position = self._next_position
+        self._next_position += 1
+        self._clauses[position] = clause
+        self._positions.setdefault(_clause_key(clause), []).append(position)
+        entry = (position, CompiledClause(*clause))
+        for index, key in self._index_keys(clause[0]):
+            index.setdefault(key, []).append(entry)
+        if self.network is not None:
+            self.network.tell(*clause)
+
+    def retract(self, sentence):
+        """Removes one copy of a previously told clause."""
+        clause = _as_clause(sentence)
+        positions = self._positions.get(_clause_key(clause))
+        if not positions:
+            raise ValueError(f"Clause was never told: {sentence}")
+        if clause[1] and self._incremental():
+            raise ValueError(f"Rules cannot be retracted in incremental mode: {sentence}")
+        position = positions.pop(0)
+        if not positions:
+            del self._positions[_clause_key(clause)]
+        del self._clauses[position]
+        for index, key in self._index_keys(clause[0]):
+            entries = index[key]
+            entries[:] = [entry for entry in entries if entry[0] != position]
+            if not entries:
+                del index[key]
+        self.tables = None
+        self.model = None
+        if self.network is not None:
+            self.network.retract(*clause)
+
+    def _incremental(self):
+        return self.mode == 'incremental' or self.network is not None
+
+    def sync_facts(self, facts):
+        """Makes facts the KB's exact set of facts (rules are kept), telling
+        and retracting only the difference with the current facts."""
+        wanted = dict.fromkeys(facts)
+        for head, body in self.clauses:
+            if not body:
+                if head in wanted:
+                    del wanted[head]
+                else:
+                    self.retract(head)
+        for fact in wanted:
+            self.tell(fact)
+
+    def _index_keys(self, head):
+        key = head.key
+        yield self.by_predicate, key
+        if head.args and isinstance(head.args[0], Constant):
+            yield self.by_first_arg, key + (head.args[0],)
         else:
-            raise ValueError("Invalid sentence for FOL KB")
+            yield self.var_first_arg, key
 
-    def ask(self, query):
-        # Returns a generator of substitutions
-        return fol_bc_ask(self, query)
+    def fetch_clauses(self, goal, first_arg=None):
+        """The CompiledClauses whose head may unify with goal, in tell order.
+
+        first_arg overrides goal's first argument, e.g. with its binding."""
+        key = goal.key
+        if first_arg is None and goal.args:
+            first_arg = goal.args[0]
+        if isinstance(first_arg, Constant):
+            matching = self.by_first_arg.get(key + (first_arg,), [])
+            general = self.var_first_arg.get(key, [])
+            if not general:
+                entries = matching
+            elif not matching:
+                entries = general
+            else:
+                entries = heapq.merge(matching, general, key=lambda entry: entry[0])
+        else:
+            entries = self.by_predicate.get(key, [])
+        return [clause for _, clause in entries]
+
+    def ask(self, query, mode=None, limit=None):
+        """Generator of the distinct answers to query, each a dict binding
+        the query's variables. The search is lazy: with limit it stops
+        after that many answers."""
+        answers = self._answers(query, mode or self.mode)
+        if instrumentation.current is not None:
+            instrumentation.current.queries += 1
+        return answers if limit is None else itertools.islice(answers, limit)
+
+    def ask_first(self, query, mode=None):
+        """The first answer to query, or None if it has none."""
+        return next(self.ask(query, mode), None)
+
+    def ask_random(self, query, mode=None, rng=random):
+        """An answer to query chosen uniformly at random, or None.
+
+        Reservoir sampling over the answer stream, so the answers are
+        never collected into a list."""
+        choice = None
+        for n, answer in enumerate(self.ask(query, mode), 1):
+            if rng.randrange(n) == 0:
+                choice = answer
+        return choice
+
+    def _answers(self, query, mode):
+        if mode == 'sld':
+            # Several proofs may give the same answer
+            return _distinct(fol_bc_ask(self, query))
+        elif mode == 'tabled':
+            # Tables are shared by every query until the KB changes
+            if self.tables is None:
+                self.tables = TableSession(self)
+            return self.tables.ask(query)
+        elif mode == 'datalog':
+            # Materialized once, then every query is an index lookup; it
+            # is rebuilt once if proofs are wanted and were not kept
+            stats = instrumentation.current
+            proofs = stats is not None and stats.proofs is not None
+            if self.model is None or (proofs and self.model.support is None):
+                self.model = DatalogModel(self.clauses, proofs)
+            return self.model.ask(query)
+        elif mode == 'incremental':
+            # Built on first use, then kept in sync by tell/retract
+            if self.network is None:
+                self.network = MatchNetwork()
+                for clause in self.clauses:
+                    self.network.tell(*clause)
+            return self.network.ask(query)
+        raise ValueError(f"Unknown query mode: {mode}")
+
+def _distinct(answers):
+    seen = set()
+    for answer in answers:
+        key = tuple(answer.items())
+        if key not in seen:
+            seen.add(key)
+            yield answer
+
+def _as_clause(sentence):
+    if isinstance(sentence, Predicate):
+        return (sentence, [])
+    elif isinstance(sentence, tuple) and len(sentence) == 2:
+        return sentence
+    raise ValueError("Invalid sentence for FOL KB")
+
+def _clause_key(clause):
+    head, body = clause
+    return (head, tuple(body))
+
+class Bindings:
+    """Substitution stored as a binding table plus a trail.
+
+    bind() records each variable on the trail, so extending costs O(1) and
+    backtracking is undo(mark): pop the bindings made since mark(). Bound
+    variables are dereferenced lazily by walk() instead of building
+    substituted copies of terms."""
+    __slots__ = ('values', 'trail')
+
+    def __init__(self, values=None):
+        self.values = values if values is not None else {}
+        self.trail = []
+
+    def walk(self, term):
+        values = self.values
+        while isinstance(term, Variable):
+            bound = values.get(term)
+            if bound is None:
+                return term
+            term = bound
+        return term
+
+    def bind(self, var, value):
+        self.values[var] = value
+        self.trail.append(var)
+
+    def mark(self):
+        return len(self.trail)
+
+    def undo(self, mark):
+        trail, values = self.trail, self.values
+        while len(trail) > mark:
+            del values[trail.pop()]
+
+    def unify(self, x, y):
+        """Extends the bindings so x and y unify; on failure some bindings
+        may remain, so callers undo() to their mark."""
+        x = self.walk(x)
+        y = self.walk(y)
+        # Variables compare by name, so two objects for ?x are the same
+        # unbound variable and binding one to the other would loop in walk
+        if x is y or (isinstance(x, Variable) and x == y):
+            return True
+        if isinstance(x, Variable):
+            self.bind(x, y)
+            return True
+        if isinstance(y, Variable):
+            self.bind(y, x)
+            return True
+        if isinstance(x, Predicate) and isinstance(y, Predicate):
+            if x.symbol != y.symbol:
+                return False
+            x, y = x.args, y.args
+        elif not (isinstance(x, (list, tuple)) and isinstance(y, (list, tuple))):
+            return x == y
+        if len(x) != len(y):
+            return False
+        for i in range(len(x)):
+            if not self.unify(x[i], y[i]):
+                return False
+        return True
+
+    def resolve(self, term):
+        """term with every bound variable replaced by its value."""
+        term = self.walk(term)
+        if isinstance(term, Predicate):
+            return term.with_args([self.resolve(arg) for arg in term.args])
+        return term
 
 def unify(x, y, theta):
+    # Dict-based interface: theta is copied once, never per binding
     if theta is None:
         return None
-    elif x == y:
-        return theta
-    elif isinstance(x, Variable):
-        return unify_var(x, y, theta)
-    elif isinstance(y, Variable):
-        return unify_var(y, x, theta)
-    elif isinstance(x, Predicate) and isinstance(y, Predicate):
-        return unify(x.args, y.args, unify(x.name, y.name, theta))
-    elif isinstance(x, list) and isinstance(y, list):
-        if len(x) != len(y): return None
-        return unify(x[1:], y[1:], unify(x[0], y[0], theta))
-    else:
-        return None
+    bindings = Bindings(dict(theta))
+    return bindings.values if bindings.unify(x, y) else None
 
 def unify_var(var, x, theta):
-    if var in theta:
-        return unify(theta[var], x, theta)
-    elif isinstance(x, Variable) and x in theta:
-        return unify(var, theta[x], theta)
-    # Occur check omitted for simplicity in this project
-    else:
-        new_theta = theta.copy()
-        new_theta[var] = x
-        return new_theta
+    return unify(var, x, theta)
 
 def fol_bc_ask(kb, query):
-    return fol_bc_or(kb, query, {})
-
-def fol_bc_or(kb, goal, theta):
-    for rule in kb.clauses:
-        lhs, rhs = rule
-        # Standardize variables to avoid name clashes (simplified: assume unique names or handle manually)
-        # For this project, we'll assume the user manages variable names or we copy
-        lhs, rhs = standardize_variables((lhs, rhs))
-        
-        unify_res = unify(lhs, goal, theta)
-        if unify_res is not None:
-            for res in fol_bc_and(kb, rhs, unify_res):
-                yield res
-
-def fol_bc_and(kb, goals, theta):
-    if not goals:
-        yield theta
+    # Yields, for each proof, the bindings of the query's variables.
+    # Renamed variables are numbered per query, so names do not pile up.
+    bindings = Bindings()
+    query_vars = []
+    _collect_variables(query, query_vars)
+    stats = instrumentation.current
+    for proof in fol_bc_or(kb, query, bindings, itertools.count(), stats):
+        if proof is not None:
+            stats.proofs.append((query, proof))
+        yield {v: bindings.resolve(v) for v in query_vars}
+
+def fol_bc_or(kb, goal, bindings, names, stats=None, depth=0):
+    # Yields once per proof of goal: a ProofNode when stats captures
+    # proofs, None otherwise
+    args = [bindings.walk(arg) for arg in goal.args]
+    if stats is not None:
+        stats.depth(depth)
+    for rule in kb.fetch_clauses(goal, args[0] if args else None):
+        if stats is not None:
+            stats.clauses += 1
+        # Cheap pre-match on the head constants before renaming anything;
+        # ground clauses are unified as they are
+        if not rule.may_match(args):
+            continue
+        if rule.ground:
+            lhs, rhs = rule.head, rule.body
+        else:
+            lhs, rhs = rule.rename(next(names))
+            if stats is not None:
+                stats.standardizations += 1
+        mark = bindings.mark()
+        matched = bindings.unify(lhs.args, args)
+        if stats is None:
+            if matched:
+                yield from fol_bc_and(kb, rhs, 0, bindings, names)
+        else:
+            _count_unification(stats, matched, bindings.mark() - mark)
+            if matched:
+                for children in fol_bc_and(kb, rhs, 0, bindings, names, stats, depth + 1):
+                    if stats.proofs is None:
+                        yield None
+                    else:
+                        yield ProofNode(bindings.resolve(goal), rule, children)
+        bindings.undo(mark)
+
+def fol_bc_and(kb, goals, i, bindings, names, stats=None, depth=0):
+    # Yields once per proof of goals[i:]: the list of their ProofNodes
+    # when stats captures proofs, None otherwise
+    if i == len(goals):
+        yield None if stats is None or stats.proofs is None else []
+    else:
+        for proof in fol_bc_or(kb, goals[i], bindings, names, stats, depth):
+            for proofs in fol_bc_and(kb, goals, i + 1, bindings, names, stats, depth):
+                yield None if proof is None else [proof] + proofs
+
+class Table:
+    __slots__ = ('answers', 'answer_set', 'complete', 'depth', 'leader')
+
+    def __init__(self):
+        self.answers = []
+        self.answer_set = set()
+        self.complete = False
+        self.depth = None   # position on the evaluation stack, None when off it
+        self.leader = None
+
+class TableSession:
+    """Tabled resolution (linear tabling) over a FOLKB.
+
+    Every subgoal is looked up by variant: a complete table returns its
+    answers directly, and a variant already under evaluation returns the
+    answers found so far instead of recursing, which is what makes left
+    recursion terminate. The oldest subgoal of a recursive cluster (its
+    leader) re-evaluates until no table gains an answer and then marks the
+    whole cluster complete."""
+    def __init__(self, kb):
+        self.kb = kb
+        self.tables = {}
+        self.stack = []
+        self.incomplete = []
+        self.answer_count = 0
+        self.names = itertools.count()
+        self.stats = None
+
+    def ask(self, query):
+        self.stats = instrumentation.current
+        query_vars = []
+        _collect_variables(query, query_vars)
+        for answer in self.solve(query):
+            bindings = Bindings()
+            bindings.unify(query, answer)
+            yield {v: bindings.resolve(v) for v in query_vars}
+
+    def solve(self, goal):
+        """The answers to goal (instances of it) as a list."""
+        key = _variant_key(goal)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = Table()
+        elif table.complete:
+            return table.answers
+        elif table.depth is not None:
+            # Recursive variant call: everything above it joins its cluster
+            for caller in self.stack[table.depth + 1:]:
+                caller.leader = min(caller.leader, table.depth)
+            return list(table.answers)
+
+        depth = table.depth = table.leader = len(self.stack)
+        self.stack.append(table)
+        start = len(self.incomplete)
+        while True:
+            count = self.answer_count
+            self._evaluate(goal, table)
+            if table.leader < depth or self.answer_count == count:
+                break
+        self.stack.pop()
+        table.depth = None
+        if table.leader == depth:
+            table.complete = True
+            for member in self.incomplete[start:]:
+                member.complete = True
+            del self.incomplete[start:]
+        else:
+            self.incomplete.append(table)
+            if self.stack:
+                caller = self.stack[-1]
+                caller.leader = min(caller.leader, table.leader)
+        return list(table.answers)
+
+    def _evaluate(self, goal, table):
+        args = list(goal.args)
+        stats = self.stats
+        if stats is not None:
+            stats.depth(len(self.stack))
+        for rule in self.kb.fetch_clauses(goal):
+            if stats is not None:
+                stats.clauses += 1
+            if not rule.may_match(args):
+                continue
+            if rule.ground:
+                lhs, rhs = rule.head, rule.body
+            else:
+                lhs, rhs = rule.rename(next(self.names))
+                if stats is not None:
+                    stats.standardizations += 1
+            bindings = Bindings()
+            matched = bindings.unify(lhs.args, args)
+            if stats is not None:
+                _count_unification(stats, matched, len(bindings.trail))
+            if matched:
+                for _ in self._solve_body(rhs, 0, bindings):
+                    answer = bindings.resolve(goal)
+                    # Keyed by variant: a non-ground answer comes back with
+                    # freshly renamed variables on every iteration
+                    key = _variant_key(answer)
+                    if key not in table.answer_set:
+                        table.answer_set.add(key)
+                        table.answers.append(answer)
+                        self.answer_count += 1
+
+    def _solve_body(self, goals, i, bindings):
+        if i == len(goals):
+            yield bindings
+            return
+        subgoal = bindings.resolve(goals[i])
+        for answer in self.solve(subgoal):
+            answer_vars = []
+            _collect_variables(answer, answer_vars)
+            if answer_vars:
+                suffix = next(self.names)
+                answer = _rename(answer, {v: Variable(f"{v.name}_{suffix}") for v in answer_vars})
+            mark = bindings.mark()
+            matched = bindings.unify(subgoal, answer)
+            if self.stats is not None:
+                _count_unification(self.stats, matched, bindings.mark() - mark)
+            if matched:
+                yield from self._solve_body(goals, i + 1, bindings)
+            bindings.undo(mark)
+
+def _count_unification(stats, matched, bound):
+    stats.unifications += 1
+    if matched:
+        stats.substitutions += bound
+    else:
+        stats.unify_failures += 1
+
+def _variant_key(expr, numbering=None):
+    # Equal for goals that are the same up to renaming of variables
+    if numbering is None:
+        numbering = {}
+    if isinstance(expr, Variable):
+        return numbering.setdefault(expr, len(numbering))
+    elif isinstance(expr, Predicate):
+        return (expr.symbol, tuple(_variant_key(arg, numbering) for arg in expr.args))
+    return expr
+
+class Relation:
+    """Ground tuples of one predicate, in insertion order, with hash
+    indexes on sets of argument positions built on first use."""
+    def __init__(self):
+        self.rows = {}
+        self.indexes = {}
+
+    def add(self, row):
+        if row in self.rows:
+            return False
+        self.rows[row] = None
+        for positions, index in self.indexes.items():
+            index.setdefault(tuple(row[i] for i in positions), []).append(row)
+        return True
+
+    def discard(self, row):
+        if row not in self.rows:
+            return False
+        del self.rows[row]
+        for positions, index in self.indexes.items():
+            key = tuple(row[i] for i in positions)
+            index[key].remove(row)
+            if not index[key]:
+                del index[key]
+        return True
+
+    def lookup(self, positions, key):
+        """The rows whose values at positions equal key."""
+        if not positions:
+            return self.rows
+        index = self.indexes.get(positions)
+        if index is None:
+            index = self.indexes[positions] = {}
+            for row in self.rows:
+                index.setdefault(tuple(row[i] for i in positions), []).append(row)
+        return index.get(key, ())
+
+class DatalogModel:
+    """Every ground consequence of a function-free KB, computed bottom-up
+    with semi-naive evaluation.
+
+    Each round only joins rule bodies where at least one atom matches a
+    tuple derived in the previous round, and every join step probes a hash
+    index on the positions already bound. Raises ValueError if a fact is
+    not ground or a rule head has a variable its body does not bind.
+
+    With proofs, the first derivation of every fact (the rule and the
+    facts matched by its body) is kept, so ask() can append proof traces
+    when they are being captured."""
+    def __init__(self, clauses, proofs=False):
+        self.relations = {}
+        self.rules = []
+        self.support = {} if proofs else None   # fact -> (rule, premises)
+        rules = self.rules
+        delta = {}
+        for head, body in clauses:
+            _check_clause(head, body)
+            if not body:
+                row = head.args
+                if self._relation(head.key).add(row):
+                    delta.setdefault(head.key, {})[row] = None
+            else:
+                rules.append((head, body, [_join_plan(body, j) for j in range(len(body))]))
+
+        # The first round is naive (everything is new), later rounds are
+        # semi-naive: one join per body atom, seeded with its delta.
+        first = True
+        while delta:
+            new = {}
+            for r, (head, body, plans) in enumerate(rules):
+                key = head.key
+                relation = self._relation(key)
+                premises = None if self.support is None else [None] * len(body)
+                for j, atom in enumerate(body):
+                    if first:
+                        rows = self._relation(atom.key).rows if j == 0 else None
+                    else:
+                        rows = delta.get(atom.key)
+                    if not rows:
+                        continue
+                    for binding in _join(plans[j], 0, rows, {}, self._relation, premises):
+                        row = tuple(binding[a] if isinstance(a, Variable) else a for a in head.args)
+                        if row not in relation.rows:
+                            derived = new.setdefault(key, {})
+                            if premises is not None and row not in derived:
+                                self.support[key + (row,)] = (r, tuple(premises))
+                            derived[row] = None
+            for key, rows in new.items():
+                relation = self.relations[key]
+                for row in rows:
+                    relation.add(row)
+            delta = new
+            first = False
+
+    def _relation(self, key):
+        if key not in self.relations:
+            self.relations[key] = Relation()
+        return self.relations[key]
+
+    def ask(self, query):
+        relation = self.relations.get(query.key)
+        if relation is None:
+            return
+        stats = instrumentation.current
+        for row, answer in _answers(relation, query):
+            if stats is not None and stats.proofs is not None and self.support is not None:
+                proof = self.proof(query.key + (row,))
+                stats.proofs.append((query, proof))
+                stats.depth(_proof_depth(proof))
+            yield answer
+
+    def proof(self, fact):
+        """A ProofNode for the fact key (symbol, arity, args) from its
+        first derivation; a fact that was not derived is a told leaf.
+        Needs a model built with proofs."""
+        atom = Predicate(symbols.value(fact[0]), fact[2])
+        support = self.support.get(fact)
+        if support is None:
+            return ProofNode(atom, CompiledClause(atom, []), [])
+        r, premises = support
+        head, body, _ = self.rules[r]
+        return ProofNode(atom, CompiledClause(head, body), [self.proof(p) for p in premises])
+
+class MatchNetwork:
+    """Incremental forward chaining over function-free rules (TREAT).
+
+    Working memory holds one Relation per predicate (the alpha memories).
+    A new fact is joined against the other alpha memories of every rule
+    that mentions its predicate, so only rule instances that use it are
+    built; their conclusions enter working memory the same way. Each rule
+    instance is recorded as a justification of its conclusion. Retracting
+    a fact over-deletes everything justified through it and re-inserts
+    what is still told or justified by surviving instances (DRed), so
+    recursive rules are handled as well."""
+    def __init__(self):
+        self.memory = {}
+        self.rules = []
+        self.rules_by_predicate = {}
+        self.told = {}              # fact -> number of times it was told
+        self.justifications = {}    # fact -> set of instances concluding it
+        self.instances = {}         # instance -> conclusion
+        self.by_premise = {}        # fact -> set of instances using it
+
+    def tell(self, head, body):
+        if body:
+            self.add_rule(head, body)
+        else:
+            self.tell_fact(head)
+
+    def retract(self, head, body):
+        if body:
+            raise ValueError("MatchNetwork only retracts facts")
+        self.retract_fact(head)
+
+    def add_rule(self, head, body):
+        _check_clause(head, body)
+        r = len(self.rules)
+        self.rules.append((head, body, [_join_plan(body, j) for j in range(len(body))]))
+        for j, atom in enumerate(body):
+            self.rules_by_predicate.setdefault(atom.key, []).append((r, j))
+        # Match the new rule against the current working memory
+        first = body[0]
+        seeds = list(self._memory(first.key).rows)
+        agenda = []
+        for row in seeds:
+            self._fire(r, 0, first.key + (row,), agenda)
+        self._insert_all(agenda)
+
+    def tell_fact(self, fact):
+        _check_clause(fact, [])
+        key = _fact_key(fact)
+        self.told[key] = self.told.get(key, 0) + 1
+        self._insert_all([key])
+
+    def retract_fact(self, fact):
+        key = _fact_key(fact)
+        count = self.told.get(key, 0)
+        if count == 0:
+            raise ValueError(f"Fact was never told: {fact}")
+        if count > 1:
+            self.told[key] = count - 1
+            return
+        del self.told[key]
+        # Over-delete everything derived through the fact...
+        deleted = set()
+        agenda = [key]
+        while agenda:
+            f = agenda.pop()
+            if f in deleted:
+                continue
+            deleted.add(f)
+            for instance in self.by_premise.get(f, ()):
+                agenda.append(self.instances[instance])
+        for f in deleted:
+            for instance in list(self.by_premise.get(f, ())):
+                self._drop_instance(instance)
+        for f in deleted:
+            self._memory(f[:2]).discard(f[2])
+        # ...then put back what is still told or justified
+        self._insert_all([f for f in deleted if f in self.told or self.justifications.get(f)])
+
+    def ask(self, query):
+        relation = self.memory.get(query.key)
+        if relation is None:
+            return
+        stats = instrumentation.current
+        for row, answer in _answers(relation, query):
+            if stats is not None and stats.proofs is not None:
+                proof = self.proof(query.key + (row,))
+                stats.proofs.append((query, proof))
+                stats.depth(_proof_depth(proof))
+            yield answer
+
+    def proof(self, fact, path=None):
+        """A ProofNode for the fact key (symbol, arity, args) in working
+        memory, built from the recorded justifications: a told fact is a
+        leaf, a derived one the rule instance concluding it. Instances
+        whose support runs back through the fact are skipped, so the proof
+        is well founded. None if the fact has no such proof."""
+        atom = Predicate(symbols.value(fact[0]), fact[2])
+        if fact in self.told:
+            return ProofNode(atom, CompiledClause(atom, []), [])
+        path = (path or set()) | {fact}
+        for r, premises in self.justifications.get(fact, ()):
+            if any(p in path for p in premises):
+                continue
+            children = [self.proof(p, path) for p in premises]
+            if all(child is not None for child in children):
+                head, body, _ = self.rules[r]
+                return ProofNode(atom, CompiledClause(head, body), children)
+        return None
+
+    def _memory(self, key):
+        if key not in self.memory:
+            self.memory[key] = Relation()
+        return self.memory[key]
+
+    def _insert_all(self, agenda):
+        while agenda:
+            f = agenda.pop()
+            if not self._memory(f[:2]).add(f[2]):
+                continue
+            for r, j in self.rules_by_predicate.get((f[0], f[1]), ()):
+                self._fire(r, j, f, agenda)
+
+    def _fire(self, r, j, f, agenda):
+        # Every instance of rule r whose j-th body atom is matched by f
+        head, body, plans = self.rules[r]
+        premises = [None] * len(body)
+        for binding in _join(plans[j], 0, (f[2],), {}, self._memory, premises):
+            instance = (r, tuple(premises))
+            if instance in self.instances:
+                continue
+            conclusion = head.key + (tuple(binding[a] if isinstance(a, Variable) else a
+                                           for a in head.args),)
+            self.instances[instance] = conclusion
+            self.justifications.setdefault(conclusion, set()).add(instance)
+            for p in set(premises):
+                self.by_premise.setdefault(p, set()).add(instance)
+            agenda.append(conclusion)
+
+    def _drop_instance(self, instance):
+        conclusion = self.instances.pop(instance)
+        self.justifications[conclusion].discard(instance)
+        if not self.justifications[conclusion]:
+            del self.justifications[conclusion]
+        for p in set(instance[1]):
+            self.by_premise[p].discard(instance)
+            if not self.by_premise[p]:
+                del self.by_premise[p]
+
+def _check_clause(head, body):
+    # Bottom-up evaluation needs ground facts and range-restricted rules
+    if not body:
+        if any(not isinstance(arg, Constant) for arg in head.args):
+            raise ValueError(f"Datalog facts must be ground: {head}")
+        return
+    head_vars, body_vars = [], []
+    _collect_variables(head, head_vars)
+    for p in body:
+        _collect_variables(p, body_vars)
+    if any(v not in body_vars for v in head_vars):
+        raise ValueError(f"Datalog rule head is not range restricted: {head}")
+
+def _join_plan(body, j):
+    # Join order: body atom j first, then the rest of the body. Each step
+    # is (body position, atom, argument positions bound on arrival).
+    plan = []
+    bound = set()
+    for i in [j] + [i for i in range(len(body)) if i != j]:
+        atom = body[i]
+        positions = tuple(k for k, a in enumerate(atom.args)
+                          if isinstance(a, Constant) or a in bound)
+        plan.append((i, atom, positions))
+        for a in atom.args:
+            if isinstance(a, Variable):
+                bound.add(a)
+    return plan
+
+def _join(plan, step, seed_rows, binding, relation, premises=None):
+    # The bindings of a rule body joined along plan: the first atom ranges
+    # over seed_rows, the others probe relation(key) on their bound
+    # positions. premises, if given, holds the fact matched per body atom.
+    if step == len(plan):
+        yield binding
+        return
+    i, atom, positions = plan[step]
+    if step == 0:
+        rows = seed_rows
     else:
-        first, rest = goals[0], goals[1:]
-        # Substitute variables in first with current theta
-        subst_first = subst(theta, first)
-        for theta_prime in fol_bc_or(kb, subst_first, theta):
-            for theta_double_prime in fol_bc_and(kb, rest, theta_prime):
-                yield theta_double_prime
+        key = tuple(binding.get(atom.args[k], atom.args[k]) for k in positions)
+        rows = relation(atom.key).lookup(positions, key)
+    stats = instrumentation.current
+    if stats is not None:
+        stats.depth(step + 1)
+    for row in rows:
+        extended = _match_row(atom.args, row, binding)
+        if stats is not None:
+            stats.clauses += 1
+            _count_unification(stats, extended is not None,
+                               0 if extended is None else len(extended) - len(binding))
+        if extended is not None:
+            if premises is not None:
+                premises[i] = atom.key + (row,)
+            yield from _join(plan, step + 1, seed_rows, extended, relation, premises)
+
+def _answers(relation, query):
+    # (row, bindings of the query's variables) for the rows matching query
+    positions = tuple(k for k, a in enumerate(query.args) if isinstance(a, Constant))
+    key = tuple(query.args[k] for k in positions)
+    query_vars = []
+    _collect_variables(query, query_vars)
+    for row in list(relation.lookup(positions, key)):
+        binding = _match_row(query.args, row, {})
+        if binding is not None:
+            yield row, {v: binding[v] for v in query_vars}
+
+def _proof_depth(proof):
+    if proof is None or not proof.children:
+        return 0
+    return 1 + max(_proof_depth(child) for child in proof.children)
+
+def _fact_key(fact):
+    return fact.key + (fact.args,)
+
+def _match_row(args, row, binding):
+    # binding extended so that args match the ground row, or None
+    extended = binding
+    for a, value in zip(args, row):
+        if isinstance(a, Variable):
+            bound = extended.get(a)
+            if bound is None:
+                if extended is binding:
+                    extended = dict(binding)
+                extended[a] = value
+            elif bound != value:
+                return None
+        elif a != value:
+            return None
+    return extended
 
 def subst(theta, expr):
     if isinstance(expr, Variable):
@@ -124,12 +993,11 @@ def subst(theta, expr):
             return subst(theta, theta[expr])
         return expr
     elif isinstance(expr, Predicate):
-        return Predicate(expr.name, [subst(theta, arg) for arg in expr.args])
+        return expr.with_args([subst(theta, arg) for arg in expr.args])
     elif isinstance(expr, list):
         return [subst(theta, arg) for arg in expr]
     return expr
 
-import itertools
 _counter = itertools.count()
 def standardize_variables(rule):
     # Rename variables in rule to be unique
@@ -142,7 +1010,7 @@ def standardize_variables(rule):
                 mapping[expr.name] = Variable(f"{expr.name}_{next(_counter)}")
             return mapping[expr.name]
         elif isinstance(expr, Predicate):
-            return Predicate(expr.name, [replace(arg) for arg in expr.args])
+            return expr.with_args([replace(arg) for arg in expr.args])
         return expr
 
     new_lhs = replace(lhs)
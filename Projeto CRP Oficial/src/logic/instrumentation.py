@@ -0,0 +1,106 @@
+"""Optional counters and proof traces for the inference engines.
+
+Nothing is counted unless a recording is active. The engines read
+`current` once per query (or per propagation / join step) and only count
+when it is not None, so the disabled cost is a global lookup. Typical use:
+
+    stats = InferenceStats()
+    with record(stats):
+        answers = list(kb.ask(query))
+    print(stats)
+"""
+import time
+from contextlib import contextmanager
+
+# The InferenceStats being recorded into, or None
+current = None
+
+class InferenceStats:
+    """Counters for one recording span (e.g. one ghost's decision in a tick).
+
+    models           models enumerated by truth-table / bit-parallel checking
+    clauses          candidate clauses, watched clauses or rows scanned
+    unifications     unification (or row matching) attempts
+    unify_failures   attempts that failed
+    substitutions    variable bindings made
+    standardizations clauses renamed apart
+    max_depth        deepest proof, join step or decision level reached
+    seconds          wall time spent inside record()
+
+    With capture_proofs, the first-order SLD, datalog and incremental
+    engines append a (query, ProofNode) pair to proofs for every answer;
+    the datalog model and the match network build it from the derivations
+    they keep. The tabled engine and the propositional engines (forward
+    chaining, CDCL, BDD and model checking) record no proofs."""
+    COUNTERS = ('queries', 'models', 'clauses', 'unifications', 'unify_failures',
+                'substitutions', 'standardizations')
+    __slots__ = COUNTERS + ('max_depth', 'seconds', 'proofs')
+
+    def __init__(self, capture_proofs=False):
+        self.proofs = [] if capture_proofs else None
+        self.reset()
+
+    def reset(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.max_depth = 0
+        self.seconds = 0.0
+        if self.proofs is not None:
+            self.proofs = []
+
+    def depth(self, depth):
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def add(self, other):
+        """Accumulates another span into this one."""
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.depth(other.max_depth)
+        self.seconds += other.seconds
+        if self.proofs is not None and other.proofs:
+            self.proofs.extend(other.proofs)
+
+    def as_dict(self):
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        result['max_depth'] = self.max_depth
+        result['seconds'] = self.seconds
+        return result
+
+    def __repr__(self):
+        counts = ', '.join(f"{k}={v}" for k, v in self.as_dict().items() if k != 'seconds')
+        return f"InferenceStats({counts}, ms={self.seconds * 1000:.2f})"
+
+class ProofNode:
+    """A resolved goal, the clause it was resolved with, and the proofs of
+    that clause's body."""
+    __slots__ = ('goal', 'clause', 'children')
+
+    def __init__(self, goal, clause, children):
+        self.goal = goal
+        self.clause = clause
+        self.children = children
+
+    def format(self, indent=0):
+        lines = ['  ' * indent + repr(self.goal)]
+        for child in self.children:
+            lines.append(child.format(indent + 1))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.format()
+
+@contextmanager
+def record(stats):
+    """Records every inference run inside the block into stats.
+
+    Recordings nest: the inner one takes over until it exits."""
+    global current
+    previous = current
+    current = stats
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.seconds += time.perf_counter() - start
+        current = previous
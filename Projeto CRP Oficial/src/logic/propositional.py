@@ -1,4 +1,27 @@
+import itertools
+import weakref
+
+from src.logic import instrumentation
+
+
 class Expr:
+    # Expressions are hash-consed: building a formula that is structurally
+    # equal to a live one returns that same node, so equality is identity
+    # and the hash is computed once at construction.
+    __slots__ = ('_hash', '__weakref__')
+    _nodes = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _interned(cls, key):
+        # Returns (node, created); a created node still needs its fields set
+        node = Expr._nodes.get(key)
+        if node is not None:
+            return node, False
+        node = object.__new__(cls)
+        node._hash = hash(key)
+        Expr._nodes[key] = node
+        return node, True
+
     def __invert__(self):
         return Not(self)
 
@@ -12,14 +35,23 @@ class Expr:
         return Implication(self, other)
 
     def __eq__(self, other):
-        return isinstance(other, Expr) and str(self) == str(other)
+        return self is other
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
 class Symbol(Expr):
-    def __init__(self, name):
-        self.name = name
+    __slots__ = ('name',)
+
+    def __new__(cls, name):
+        node, created = Expr._interned(cls, (cls, name))
+        if created:
+            node.name = name
+        return node
+
+    def __reduce__(self):
+        # Rebuilt through __new__, so copies and unpickled nodes are interned
+        return (Symbol, (self.name,))
 
     def __repr__(self):
         return self.name
@@ -28,8 +60,16 @@ class Symbol(Expr):
         return model.get(self, False)
 
 class Not(Expr):
-    def __init__(self, operand):
-        self.operand = operand
+    __slots__ = ('operand',)
+
+    def __new__(cls, operand):
+        node, created = Expr._interned(cls, (cls, operand))
+        if created:
+            node.operand = operand
+        return node
+
+    def __reduce__(self):
+        return (Not, (self.operand,))
 
     def __repr__(self):
         return f"~{self.operand}"
@@ -38,8 +78,16 @@ class Not(Expr):
         return not self.operand.evaluate(model)
 
 class And(Expr):
-    def __init__(self, *operands):
-        self.operands = operands
+    __slots__ = ('operands',)
+
+    def __new__(cls, *operands):
+        node, created = Expr._interned(cls, (cls, operands))
+        if created:
+            node.operands = operands
+        return node
+
+    def __reduce__(self):
+        return (And, self.operands)
 
     def __repr__(self):
         return f"({' & '.join(map(str, self.operands))})"
@@ -48,8 +96,16 @@ class And(Expr):
         return all(op.evaluate(model) for op in self.operands)
 
 class Or(Expr):
-    def __init__(self, *operands):
-        self.operands = operands
+    __slots__ = ('operands',)
+
+    def __new__(cls, *operands):
+        node, created = Expr._interned(cls, (cls, operands))
+        if created:
+            node.operands = operands
+        return node
+
+    def __reduce__(self):
+        return (Or, self.operands)
 
     def __repr__(self):
         return f"({' | '.join(map(str, self.operands))})"
@@ -58,9 +114,17 @@ class Or(Expr):
         return any(op.evaluate(model) for op in self.operands)
 
 class Implication(Expr):
-    def __init__(self, antecedent, consequent):
-        self.antecedent = antecedent
-        self.consequent = consequent
+    __slots__ = ('antecedent', 'consequent')
+
+    def __new__(cls, antecedent, consequent):
+        node, created = Expr._interned(cls, (cls, antecedent, consequent))
+        if created:
+            node.antecedent = antecedent
+            node.consequent = consequent
+        return node
+
+    def __reduce__(self):
+        return (Implication, (self.antecedent, self.consequent))
 
     def __repr__(self):
         return f"({self.antecedent} >> {self.consequent})"
@@ -69,24 +133,267 @@ class Implication(Expr):
         return (not self.antecedent.evaluate(model)) or self.consequent.evaluate(model)
 
 class PropositionalKB:
-    def __init__(self):
-        self.clauses = []
+    # Inference methods accepted by ask(): 'auto' forward chains when the KB
+    # is Horn and the query is atomic and otherwise uses 'dpll' (the CDCL
+    # refutation solver); 'fc' forces forward chaining; 'tt' checks every
+    # model one at a time by walking the formulas (the reference checker),
+    # 'compiled' does the same over compiled evaluators and 'vector' checks
+    # the models as packed bit columns; 'bdd' compiles the KB into a binary
+    # decision diagram.
+    METHODS = ('auto', 'fc', 'dpll', 'tt', 'compiled', 'vector', 'bdd')
+
+    def __init__(self, method='auto'):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown inference method: {method}")
+        self.method = method
+        # Bumped whenever a sentence other than a named fact changes
+        self.rules_version = 0
+        self._reset()
+
+    @property
+    def clauses(self):
+        return list(self._sentences.values())
 
     def tell(self, sentence):
-        self.clauses.append(sentence)
+        """Adds sentence and returns a handle that retract() accepts.
+
+        Sentences stay until retracted, so rules can be told once and only
+        the facts that change are updated (see set_fact)."""
+        self.rules_version += 1
+        return self._tell(sentence)
+
+    def _tell(self, sentence):
+        handle = self._next_handle
+        self._next_handle += 1
+        self._sentences[handle] = sentence
+        cnf = self._cnf_of[handle] = to_cnf(sentence)
+        if all(is_horn_clause(c) for c in cnf):
+            self._horn_ids[handle] = [self._closure.add(*horn_form(c)) for c in cnf]
+        self._invalidate()
+        return handle
 
-    def ask(self, query):
-        return tt_entails(And(*self.clauses), query)
+    def retract(self, handle):
+        del self._sentences[handle]
+        name = self._fact_names.pop(handle, None)
+        if name is not None:
+            del self._facts[name]
+        else:
+            self.rules_version += 1
+        del self._cnf_of[handle]
+        for cid in self._horn_ids.pop(handle, ()):
+            self._closure.remove(cid)
+        self._invalidate()
+
+    def set_fact(self, name, sentence):
+        """Stores sentence as the fact called name, replacing the previous
+        one. Telling the same fact again leaves the KB untouched."""
+        handle = self._facts.get(name)
+        if handle is not None:
+            if self._sentences[handle] is sentence:
+                return handle
+            self.retract(handle)
+        handle = self._facts[name] = self._tell(sentence)
+        self._fact_names[handle] = name
+        return handle
+
+    def retract_fact(self, name):
+        handle = self._facts.get(name)
+        if handle is not None:
+            self.retract(handle)
+
+    def retract_facts(self):
+        for name in list(self._facts):
+            self.retract_fact(name)
+
+    def ask(self, query, method=None):
+        return self.ask_many([query], method)[query]
+
+    def ask_many(self, queries, method=None):
+        """Answers several queries from one inference run.
+
+        Returns a dict mapping each query to whether the KB entails it."""
+        method = method or self.method
+        queries = list(dict.fromkeys(queries))
+        if instrumentation.current is not None:
+            instrumentation.current.queries += len(queries)
+        if method in ('auto', 'fc'):
+            if not self.is_horn() and method == 'fc':
+                raise ValueError("Forward chaining needs a Horn KB")
+            if self.is_horn():
+                closure = self._closure.inferred
+                answers = {}
+                rest = []
+                for q in queries:
+                    symbols = _conjoined_symbols(q)
+                    if symbols is not None:
+                        answers[q] = None in closure or all(p in closure for p in symbols)
+                    elif method == 'fc':
+                        raise ValueError("Forward chaining answers conjunctions of symbols only")
+                    else:
+                        rest.append(q)
+                answers.update(self._dpll_ask_many(rest))
+                return answers
+            return self._dpll_ask_many(queries)
+        elif method == 'dpll':
+            return self._dpll_ask_many(queries)
+        elif method == 'tt':
+            return tt_entails_many(And(*self.clauses), queries)
+        elif method == 'compiled':
+            if self._checker is None:
+                self._checker = CompiledModelChecker(And(*self.clauses))
+            return self._checker.entails_many(queries)
+        elif method == 'vector':
+            return vector_entails_many(And(*self.clauses), queries)
+        elif method == 'bdd':
+            compiled = self.compile_bdd()
+            return {q: compiled.entails(q) for q in queries}
+        raise ValueError(f"Unknown inference method: {method}")
 
     def retract_all(self):
-        self.clauses = []
+        self._reset()
+
+    def compile_bdd(self):
+        """The KB as a CompiledKB: the sentences other than named facts are
+        compiled once per rules_version into a BDD manager that is kept
+        for the KB's lifetime, and the facts are applied by conditioning
+        the compiled rules on their literals, so changing facts never
+        recompiles the rules."""
+        if self._bdd is None:
+            bdd = self._bdd_manager
+            if len(bdd.restrict_cache) + len(bdd.apply_cache) > BDD_CACHE_LIMIT:
+                bdd.clear_caches()
+            if self._bdd_rules is None or self._bdd_rules[0] != self.rules_version:
+                facts = set(self._fact_names)
+                rules = [sentence for handle, sentence in self._sentences.items()
+                         if handle not in facts]
+                order = []
+                for sentence in rules:
+                    _symbols_in_order(sentence, order)
+                for symbol in order:
+                    bdd.add_symbol(symbol)
+                root = BDD.TRUE
+                for sentence in rules:
+                    root = bdd.apply('&', root, bdd.compile(sentence))
+                self._bdd_rules = (self.rules_version, root, frozenset(order))
+            _, root, symbols = self._bdd_rules
+            literals = []
+            for handle in self._fact_names:
+                sentence = self._sentences[handle]
+                symbols = symbols | get_symbols(sentence)
+                fact_literals = _literals(sentence)
+                if fact_literals is None:
+                    # Not a conjunction of literals: conjoined into the
+                    # diagram instead (the apply cache is shared)
+                    root = bdd.apply('&', root, bdd.compile(sentence))
+                else:
+                    literals.extend(fact_literals)
+            self._bdd = CompiledKB(bdd, root, symbols).condition(literals)
+        return self._bdd
+
+    def is_horn(self):
+        return len(self._horn_ids) == len(self._sentences)
+
+    def _reset(self):
+        self.rules_version += 1
+        self._sentences = {}
+        self._cnf_of = {}
+        self._facts = {}
+        self._fact_names = {}
+        self._next_handle = 0
+        # The forward-chaining closure of the Horn sentences is kept up to
+        # date on every tell/retract instead of being recomputed per query
+        self._closure = HornClosure()
+        self._horn_ids = {}
+        # The BDD manager outlives fact changes: the rules are compiled
+        # into it once per rules_version (see compile_bdd)
+        self._bdd_manager = BDD()
+        self._bdd_rules = None
+        self._invalidate()
+
+    def _invalidate(self):
+        self._cnf = None
+        self._solver = None
+        self._checker = None
+        self._bdd = None
+
+    def _cnf_clauses(self):
+        if self._cnf is None:
+            self._cnf = [c for cnf in self._cnf_of.values() for c in cnf]
+        return self._cnf
+
+    def _dpll_ask_many(self, queries):
+        # The CNF of the KB is loaded once into an incremental solver. Each
+        # query adds the clauses of ~query guarded by a fresh activation
+        # literal, so learned clauses are kept across queries.
+        if not queries:
+            return {}
+        if self._solver is None:
+            self._solver = SymbolSolver()
+            self._solver.add_clauses(self._cnf_clauses())
+        return self._solver.entails_many(queries)
+
+class DecisionTable:
+    """Memoized answers to a fixed list of queries, one entry per situation.
+
+    A situation is the dict of named facts passed to lookup() (None meaning
+    the fact is absent). The first time a situation appears its facts are
+    set in the KB and the queries answered with ask_many; afterwards the
+    answers come straight from the table. The table is flushed whenever
+    the KB's rules change."""
+    def __init__(self, kb, queries):
+        self.kb = kb
+        self.queries = list(queries)
+        self.table = {}
+        self.rules_version = kb.rules_version
+
+    def lookup(self, facts):
+        if self.kb.rules_version != self.rules_version:
+            self.table.clear()
+            self.rules_version = self.kb.rules_version
+        key = frozenset(facts.items())
+        answers = self.table.get(key)
+        if answers is None:
+            for name, sentence in facts.items():
+                if sentence is None:
+                    self.kb.retract_fact(name)
+                else:
+                    self.kb.set_fact(name, sentence)
+            answers = self.table[key] = self.kb.ask_many(self.queries)
+        return answers
 
 def tt_entails(kb, alpha):
     symbols = list(get_symbols(kb) | get_symbols(alpha))
     return tt_check_all(kb, alpha, symbols, {})
 
+def tt_entails_many(kb, queries):
+    # One enumeration of the models of kb: a query stays entailed until
+    # some model of kb falsifies it.
+    queries = list(queries)
+    symbols = set(get_symbols(kb))
+    for q in queries:
+        symbols |= get_symbols(q)
+    pending = set(queries)
+    tt_check_many(kb, pending, list(symbols), {})
+    return {q: q in pending for q in queries}
+
+def tt_check_many(kb, pending, symbols, model):
+    if not pending:
+        return
+    if not symbols:
+        if instrumentation.current is not None:
+            instrumentation.current.models += 1
+        if pl_true(kb, model):
+            pending.difference_update([q for q in pending if not pl_true(q, model)])
+        return
+    P = symbols[0]
+    rest = symbols[1:]
+    tt_check_many(kb, pending, rest, extend(model, P, True))
+    tt_check_many(kb, pending, rest, extend(model, P, False))
+
 def tt_check_all(kb, alpha, symbols, model):
     if not symbols:
+        if instrumentation.current is not None:
+            instrumentation.current.models += 1
         if pl_true(kb, model):
             return pl_true(alpha, model)
         else:
@@ -101,6 +408,393 @@ def tt_check_all(kb, alpha, symbols, model):
 def pl_true(exp, model):
     return exp.evaluate(model)
 
+def compile_expr(exp, index):
+    """Python source for exp over a model packed into the int m, where bit
+    index[s] holds the value of symbol s."""
+    if isinstance(exp, Symbol):
+        return f"(m >> {index[exp]} & 1)"
+    elif isinstance(exp, Not):
+        return f"(not {compile_expr(exp.operand, index)})"
+    elif isinstance(exp, And):
+        if not exp.operands:
+            return "True"
+        return f"({' and '.join(compile_expr(op, index) for op in exp.operands)})"
+    elif isinstance(exp, Or):
+        if not exp.operands:
+            return "False"
+        return f"({' or '.join(compile_expr(op, index) for op in exp.operands)})"
+    elif isinstance(exp, Implication):
+        return (f"(not {compile_expr(exp.antecedent, index)} or "
+                f"{compile_expr(exp.consequent, index)})")
+    raise ValueError(f"Cannot compile {exp!r}")
+
+def compile_evaluator(exp, index):
+    return eval(f"lambda m: {compile_expr(exp, index)}")
+
+class CompiledModelChecker:
+    """Truth-table entailment over compiled evaluators.
+
+    Models are ints 0..2^n-1 enumerated in order, so no model dicts are
+    built. The KB is compiled once and each query on first use."""
+    def __init__(self, kb):
+        self.index = {}
+        self.kb_width = self._add_symbols(kb)
+        self.kb_fn = compile_evaluator(kb, self.index)
+        self.queries = {}
+
+    def _add_symbols(self, exp):
+        # Registers the symbols of exp and returns the number of bits it spans
+        width = 0
+        for s in get_symbols(exp):
+            if s not in self.index:
+                self.index[s] = len(self.index)
+            width = max(width, self.index[s] + 1)
+        return width
+
+    def query(self, q):
+        compiled = self.queries.get(q)
+        if compiled is None:
+            width = self._add_symbols(q)
+            compiled = self.queries[q] = (compile_evaluator(q, self.index), width)
+        return compiled
+
+    def entails_many(self, queries):
+        queries = list(queries)
+        pending = []
+        width = self.kb_width
+        for q in queries:
+            fn, q_width = self.query(q)
+            pending.append((q, fn))
+            width = max(width, q_width)
+        kb_fn = self.kb_fn
+        enumerated = 0
+        for m in range(1 << width):
+            enumerated += 1
+            if kb_fn(m):
+                pending = [(q, fn) for q, fn in pending if fn(m)]
+                if not pending:
+                    break
+        if instrumentation.current is not None:
+            instrumentation.current.models += enumerated
+        entailed = {q for q, _ in pending}
+        return {q: q in entailed for q in queries}
+
+    def entails(self, q):
+        return self.entails_many([q])[q]
+
+# --- Bit-parallel model checking --------------------------------------------
+# The 2^n models are the bit positions of Python ints: the column of symbol i
+# has bit m set iff symbol i is true in model m, so a whole formula is
+# evaluated over every model with a few bitwise operations. Symbols beyond
+# the first VECTOR_CHUNK_BITS are fixed per chunk of 2^VECTOR_CHUNK_BITS models.
+
+VECTOR_CHUNK_BITS = 16
+
+_column_cache = {}
+
+def _low_columns(k):
+    if k not in _column_cache:
+        full = (1 << (1 << k)) - 1
+        columns = []
+        for i in range(k):
+            half = 1 << i
+            period = half << 1
+            block = ((1 << half) - 1) << half
+            columns.append(block * (full // ((1 << period) - 1)))
+        _column_cache[k] = (columns, full)
+    return _column_cache[k]
+
+def _vector_chunks(symbols):
+    # Yields (columns, full): a column per symbol over one chunk of models
+    symbols = list(symbols)
+    k = min(len(symbols), VECTOR_CHUNK_BITS)
+    low, full = _low_columns(k)
+    high = symbols[k:]
+    columns = dict(zip(symbols, low))
+    for chunk in range(1 << len(high)):
+        for j, s in enumerate(high):
+            columns[s] = full if chunk >> j & 1 else 0
+        yield columns, full
+
+def pl_columns(exp, columns, full, memo=None):
+    """The bit column of exp given the columns of its symbols."""
+    if memo is None:
+        memo = {}
+    if isinstance(exp, Symbol):
+        return columns[exp]
+    if exp in memo:
+        return memo[exp]
+    if isinstance(exp, Not):
+        result = full ^ pl_columns(exp.operand, columns, full, memo)
+    elif isinstance(exp, And):
+        result = full
+        for op in exp.operands:
+            result &= pl_columns(op, columns, full, memo)
+    elif isinstance(exp, Or):
+        result = 0
+        for op in exp.operands:
+            result |= pl_columns(op, columns, full, memo)
+    elif isinstance(exp, Implication):
+        result = (full ^ pl_columns(exp.antecedent, columns, full, memo)) | \
+            pl_columns(exp.consequent, columns, full, memo)
+    else:
+        raise ValueError(f"Cannot evaluate {exp!r}")
+    memo[exp] = result
+    return result
+
+def vector_entails_many(kb, queries):
+    queries = list(queries)
+    symbols = set(get_symbols(kb))
+    for q in queries:
+        symbols |= get_symbols(q)
+    pending = list(dict.fromkeys(queries))
+    stats = instrumentation.current
+    for columns, full in _vector_chunks(symbols):
+        if stats is not None:
+            stats.models += full.bit_length()
+        memo = {}
+        kb_column = pl_columns(kb, columns, full, memo)
+        if kb_column:
+            pending = [q for q in pending
+                       if not kb_column & ~pl_columns(q, columns, full, memo)]
+            if not pending:
+                break
+    entailed = set(pending)
+    return {q: q in entailed for q in queries}
+
+def vector_entails(kb, alpha):
+    return vector_entails_many(kb, [alpha])[alpha]
+
+def vector_satisfiable(exp):
+    return any(pl_columns(exp, columns, full)
+               for columns, full in _vector_chunks(get_symbols(exp)))
+
+def vector_count_models(exp, symbols=None):
+    """Number of models of exp over symbols (by default its own symbols)."""
+    symbols = set(get_symbols(exp) if symbols is None else symbols)
+    symbols |= get_symbols(exp)
+    return sum(pl_columns(exp, columns, full).bit_count()
+               for columns, full in _vector_chunks(symbols))
+
+# --- Ordered binary decision diagrams ----------------------------------------
+
+_BDD_OPS = {
+    '&': lambda a, b: a and b,
+    '|': lambda a, b: a or b,
+    '^': lambda a, b: a != b,
+    '>>': lambda a, b: (not a) or b,
+}
+
+# Cached apply/restrict results kept by a long-lived manager before they
+# are dropped (the diagrams themselves are kept)
+BDD_CACHE_LIMIT = 200000
+
+class BDD:
+    """Reduced ordered BDD manager.
+
+    Nodes are ints indexing self.nodes, whose entries are (level, low, high);
+    0 and 1 are the terminals. The unique table keeps every node reduced and
+    shared, and apply/restrict results are cached, so operations are
+    polynomial in the size of the diagrams involved."""
+    FALSE = 0
+    TRUE = 1
+
+    def __init__(self, order=()):
+        self.symbols = []
+        self.level = {}
+        self.nodes = [(float('inf'), None, None), (float('inf'), None, None)]
+        self.unique = {}
+        self.apply_cache = {}
+        self.restrict_cache = {}
+        for symbol in order:
+            self.add_symbol(symbol)
+
+    def add_symbol(self, symbol):
+        # New symbols go below every existing one in the order
+        if symbol not in self.level:
+            self.level[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.level[symbol]
+
+    def mk(self, level, low, high):
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.unique[key] = len(self.nodes)
+            self.nodes.append(key)
+        return node
+
+    def var(self, symbol):
+        return self.mk(self.add_symbol(symbol), self.FALSE, self.TRUE)
+
+    def negate(self, u):
+        return self.apply('^', u, self.TRUE)
+
+    def apply(self, op, u, v):
+        key = (op, u, v)
+        result = self.apply_cache.get(key)
+        if result is not None:
+            return result
+        if u <= 1 and v <= 1:
+            result = int(_BDD_OPS[op](u, v))
+        elif op == '&' and (u == 0 or v == 0):
+            result = 0
+        elif op == '|' and (u == 1 or v == 1):
+            result = 1
+        elif op in ('&', '|') and u == v:
+            result = u
+        else:
+            lu, u0, u1 = self.nodes[u]
+            lv, v0, v1 = self.nodes[v]
+            level = min(lu, lv)
+            if lu != level:
+                u0 = u1 = u
+            if lv != level:
+                v0 = v1 = v
+            result = self.mk(level, self.apply(op, u0, v0), self.apply(op, u1, v1))
+        self.apply_cache[key] = result
+        return result
+
+    def compile(self, exp):
+        if isinstance(exp, Symbol):
+            return self.var(exp)
+        elif isinstance(exp, Not):
+            return self.negate(self.compile(exp.operand))
+        elif isinstance(exp, And):
+            u = self.TRUE
+            for op in exp.operands:
+                u = self.apply('&', u, self.compile(op))
+            return u
+        elif isinstance(exp, Or):
+            u = self.FALSE
+            for op in exp.operands:
+                u = self.apply('|', u, self.compile(op))
+            return u
+        elif isinstance(exp, Implication):
+            return self.apply('>>', self.compile(exp.antecedent), self.compile(exp.consequent))
+        raise ValueError(f"Cannot compile {exp!r}")
+
+    def restrict(self, u, assignment):
+        """u with the symbols of assignment ({Symbol: bool}) fixed."""
+        values = {self.add_symbol(s): bool(v) for s, v in assignment.items()}
+        return self._restrict(u, values, frozenset(values.items()))
+
+    def _restrict(self, u, values, key):
+        if u <= 1:
+            return u
+        result = self.restrict_cache.get((key, u))
+        if result is None:
+            level, low, high = self.nodes[u]
+            if level in values:
+                result = self._restrict(high if values[level] else low, values, key)
+            else:
+                result = self.mk(level, self._restrict(low, values, key),
+                                 self._restrict(high, values, key))
+            self.restrict_cache[(key, u)] = result
+        return result
+
+    def implies(self, u, v):
+        return self.apply('&', u, self.negate(v)) == self.FALSE
+
+    def count(self, u, num_symbols=None):
+        """Number of assignments to the first num_symbols symbols (all of
+        them by default) that satisfy u."""
+        n = len(self.symbols) if num_symbols is None else num_symbols
+        memo = {}
+
+        def below(node):
+            # Models over the levels from node's level to n
+            if node <= 1:
+                return node
+            if node not in memo:
+                level, low, high = self.nodes[node]
+                memo[node] = (below(low) << (min(self.nodes[low][0], n) - level - 1)) + \
+                    (below(high) << (min(self.nodes[high][0], n) - level - 1))
+            return memo[node]
+
+        if u <= 1:
+            return u << n
+        return below(u) << self.nodes[u][0]
+
+    def clear_caches(self):
+        self.apply_cache.clear()
+        self.restrict_cache.clear()
+
+
+class CompiledKB:
+    """A KB compiled into a BDD, optionally conditioned on fact literals.
+
+    Conditioning restricts the diagram instead of recompiling, and
+    entailment and model counting are then linear in the diagram."""
+    def __init__(self, bdd, root, symbols, assignment=None):
+        self.bdd = bdd
+        self.root = root
+        # The KB's symbols; the manager may hold others (e.g. from queries)
+        self.symbols = frozenset(symbols)
+        self.assignment = dict(assignment or {})
+
+    def condition(self, literals):
+        """The KB with every literal (Symbol or Not(Symbol)) taken as true."""
+        assignment = {}
+        consistent = True
+        for lit in literals:
+            symbol, value = (lit.operand, False) if isinstance(lit, Not) else (lit, True)
+            if assignment.setdefault(symbol, value) != value:
+                consistent = False
+        root = self.bdd.restrict(self.root, assignment) if consistent else BDD.FALSE
+        for s, value in self.assignment.items():
+            if assignment.setdefault(s, value) != value:
+                root = BDD.FALSE
+        return CompiledKB(self.bdd, root, self.symbols, assignment)
+
+    def satisfiable(self):
+        return self.root != BDD.FALSE
+
+    def entails(self, query):
+        if isinstance(query, Symbol) and query not in self.assignment:
+            return self.bdd.restrict(self.root, {query: False}) == BDD.FALSE
+        q = self.bdd.compile(query)
+        if self.assignment:
+            q = self.bdd.restrict(q, self.assignment)
+        return self.bdd.implies(self.root, q)
+
+    def count_models(self):
+        """Models of the KB (and of the conditioning literals) over the KB's
+        symbols."""
+        n = len(self.bdd.symbols)
+        free = n - len(self.symbols) + sum(1 for s in self.assignment if s in self.symbols)
+        return self.bdd.count(self.root, n) >> free
+
+def _literals(exp):
+    # The literals of a literal or a conjunction of literals, else None
+    if isinstance(exp, Symbol) or (isinstance(exp, Not) and isinstance(exp.operand, Symbol)):
+        return [exp]
+    if isinstance(exp, And):
+        literals = []
+        for op in exp.operands:
+            op_literals = _literals(op)
+            if op_literals is None:
+                return None
+            literals.extend(op_literals)
+        return literals
+    return None
+
+def _symbols_in_order(exp, order):
+    # Appends the symbols of exp to order by first appearance
+    if isinstance(exp, Symbol):
+        if exp not in order:
+            order.append(exp)
+    elif isinstance(exp, Not):
+        _symbols_in_order(exp.operand, order)
+    elif isinstance(exp, (And, Or)):
+        for op in exp.operands:
+            _symbols_in_order(op, order)
+    elif isinstance(exp, Implication):
+        _symbols_in_order(exp.antecedent, order)
+        _symbols_in_order(exp.consequent, order)
+
 def get_symbols(exp):
     if isinstance(exp, Symbol):
         return {exp}
@@ -119,3 +813,516 @@ def extend(model, var, val):
     new_model = model.copy()
     new_model[var] = val
     return new_model
+
+
+# --- CNF conversion ---------------------------------------------------------
+# A clause is a frozenset of literals, a literal being a Symbol or Not(Symbol).
+#
+# Or is distributed over And only while the result stays small: an operand
+# that would push a disjunction past CNF_DISTRIBUTE_LIMIT clauses is replaced
+# by a fresh auxiliary symbol t, with the clauses of t -> operand added
+# alongside (a definitional, Tseitin-style encoding; one direction suffices
+# because in NNF every subformula occurs positively). The CNF is then
+# equisatisfiable with the sentence and linear in its size. Sentences that
+# are clauses, or Horn after distribution, get no auxiliary symbols.
+
+CNF_DISTRIBUTE_LIMIT = 8
+
+_aux_counter = itertools.count()
+
+def to_cnf(sentence):
+    clauses = []
+    seen = set()
+    definitions = []
+    for clause in _cnf_clauses(_nnf(sentence, True), definitions) + definitions:
+        if clause not in seen and not _is_tautology(clause):
+            seen.add(clause)
+            clauses.append(clause)
+    return clauses
+
+def _nnf(exp, positive):
+    # Negation normal form over Symbol/Not/And/Or with implications removed.
+    if isinstance(exp, Symbol):
+        return exp if positive else Not(exp)
+    elif isinstance(exp, Not):
+        return _nnf(exp.operand, not positive)
+    elif isinstance(exp, Implication):
+        return _nnf(Or(Not(exp.antecedent), exp.consequent), positive)
+    elif isinstance(exp, And):
+        ops = [_nnf(op, positive) for op in exp.operands]
+        return And(*ops) if positive else Or(*ops)
+    elif isinstance(exp, Or):
+        ops = [_nnf(op, positive) for op in exp.operands]
+        return Or(*ops) if positive else And(*ops)
+    raise ValueError(f"Cannot convert {exp!r} to CNF")
+
+def _cnf_clauses(exp, definitions):
+    # The clauses of exp (in NNF); auxiliary definitions go to definitions
+    if isinstance(exp, (Symbol, Not)):
+        return [frozenset([exp])]
+    elif isinstance(exp, And):
+        clauses = []
+        for op in exp.operands:
+            clauses.extend(_cnf_clauses(op, definitions))
+        return clauses
+    # Or: distribute over the CNF of every operand, naming the operands
+    # that would multiply the clauses past the limit
+    clauses = [frozenset()]
+    for op in exp.operands:
+        op_clauses = _cnf_clauses(op, definitions)
+        if len(op_clauses) > 1 and len(clauses) * len(op_clauses) > CNF_DISTRIBUTE_LIMIT:
+            aux = Symbol(f"_cnf{next(_aux_counter)}")
+            definitions.extend(c | {Not(aux)} for c in op_clauses)
+            op_clauses = [frozenset([aux])]
+        clauses = [c | d for c in clauses for d in op_clauses]
+    return clauses
+
+def _is_tautology(clause):
+    return any(isinstance(lit, Not) and lit.operand in clause for lit in clause)
+
+
+# --- Horn clauses and forward chaining ---------------------------------------
+# A Horn clause in implication form is (premises, conclusion); goal clauses
+# (no positive literal) have conclusion None, i.e. their premises imply False.
+
+def is_horn_clause(clause):
+    return sum(1 for lit in clause if isinstance(lit, Symbol)) <= 1
+
+def is_definite_clause(clause):
+    return sum(1 for lit in clause if isinstance(lit, Symbol)) == 1
+
+def horn_form(clause):
+    premises = tuple(lit.operand for lit in clause if isinstance(lit, Not))
+    conclusion = next((lit for lit in clause if isinstance(lit, Symbol)), None)
+    return premises, conclusion
+
+def pl_fc_entails(kb, q):
+    clauses = to_cnf(kb)
+    if not all(is_horn_clause(c) for c in clauses):
+        raise ValueError("Forward chaining needs a Horn KB")
+    return pl_fc_horn_entails([horn_form(c) for c in clauses], q)
+
+def pl_fc_horn_entails(clauses, q):
+    goals = _conjoined_symbols(q)
+    if goals is None:
+        raise ValueError("Forward chaining answers conjunctions of symbols only")
+    inferred = pl_fc_closure(clauses)
+    return None in inferred or all(p in inferred for p in goals)
+
+def pl_fc_closure(clauses):
+    # PL-FC-Entails agenda/count loop: every clause keeps a count of premises
+    # not yet inferred and fires when it drops to zero, so each clause is
+    # processed once. The closure contains None when a goal clause fires,
+    # i.e. the KB is inconsistent and entails anything.
+    count = []
+    by_premise = {}
+    agenda = []
+    for i, (premises, conclusion) in enumerate(clauses):
+        premises = set(premises)
+        count.append(len(premises))
+        for p in premises:
+            by_premise.setdefault(p, []).append(i)
+        if not premises:
+            agenda.append(conclusion)
+    inferred = set()
+    stats = instrumentation.current
+    while agenda:
+        p = agenda.pop()
+        if p in inferred:
+            continue
+        inferred.add(p)
+        if stats is not None:
+            stats.clauses += len(by_premise.get(p, ()))
+        for i in by_premise.get(p, ()):
+            count[i] -= 1
+            if count[i] == 0:
+                agenda.append(clauses[i][1])
+    return inferred
+
+class HornClosure:
+    """Forward-chaining closure of a changing set of Horn clauses.
+
+    Works like pl_fc_closure, but clauses can be added and removed and the
+    closure is repaired incrementally. Each clause keeps its count of
+    premises outside the closure, which doubles as the dependency record:
+    removing support over-deletes everything derived through it and then
+    re-derives what still has a firing clause (DRed), so cyclic rules are
+    handled correctly and only the affected part of the closure is touched.
+    """
+    def __init__(self):
+        self.clauses = {}
+        self.count = {}
+        self.by_premise = {}
+        self.by_conclusion = {}
+        self.inferred = set()
+        self._next_id = 0
+
+    def add(self, premises, conclusion):
+        cid = self._next_id
+        self._next_id += 1
+        premises = frozenset(premises)
+        self.clauses[cid] = (premises, conclusion)
+        self.count[cid] = sum(1 for p in premises if p not in self.inferred)
+        for p in premises:
+            self.by_premise.setdefault(p, set()).add(cid)
+        self.by_conclusion.setdefault(conclusion, set()).add(cid)
+        if self.count[cid] == 0:
+            self._propagate([conclusion])
+        return cid
+
+    def remove(self, cid):
+        premises, conclusion = self.clauses.pop(cid)
+        for p in premises:
+            self.by_premise[p].discard(cid)
+        self.by_conclusion[conclusion].discard(cid)
+        if self.count.pop(cid) == 0 and conclusion in self.inferred:
+            self._rederive(self._overdelete(conclusion))
+
+    def _propagate(self, agenda):
+        stats = instrumentation.current
+        while agenda:
+            p = agenda.pop()
+            if p in self.inferred:
+                continue
+            self.inferred.add(p)
+            if stats is not None:
+                stats.clauses += len(self.by_premise.get(p, ()))
+            for cid in self.by_premise.get(p, ()):
+                self.count[cid] -= 1
+                if self.count[cid] == 0:
+                    agenda.append(self.clauses[cid][1])
+
+    def _overdelete(self, seed):
+        deleted = set()
+        agenda = [seed]
+        while agenda:
+            p = agenda.pop()
+            if p in deleted:
+                continue
+            deleted.add(p)
+            for cid in self.by_premise.get(p, ()):
+                if self.count[cid] == 0:
+                    agenda.append(self.clauses[cid][1])
+        for p in deleted:
+            self.inferred.discard(p)
+            for cid in self.by_premise.get(p, ()):
+                self.count[cid] += 1
+        return deleted
+
+    def _rederive(self, deleted):
+        self._propagate([p for p in deleted
+                         if any(self.count[cid] == 0 for cid in self.by_conclusion.get(p, ()))])
+
+def _conjoined_symbols(exp):
+    # The symbols of a conjunction of atoms (or of a single atom), else None
+    if isinstance(exp, Symbol):
+        return [exp]
+    if isinstance(exp, And):
+        symbols = []
+        for op in exp.operands:
+            sub = _conjoined_symbols(op)
+            if sub is None:
+                return None
+            symbols.extend(sub)
+        return symbols
+    return None
+
+
+# --- CDCL satisfiability -----------------------------------------------------
+# Variables are 1..n and literals are signed ints (DIMACS convention).
+
+class CDCLSolver:
+    def __init__(self, num_vars=0):
+        self.num_vars = 0
+        self.clauses = []
+        self.watches = {}
+        self.value = [0]
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.occurs = [[0, 0]]     # [positive, negative] occurrences per variable
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.bump = 1.0
+        self.unsat = False
+        self.visits = 0            # watched clauses visited, for instrumentation
+        self.new_vars(num_vars)
+
+    def new_var(self):
+        self.num_vars += 1
+        v = self.num_vars
+        self.value.append(0)
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        self.occurs.append([0, 0])
+        self.watches[v] = []
+        self.watches[-v] = []
+        return v
+
+    def new_vars(self, count):
+        for _ in range(count):
+            self.new_var()
+
+    def add_clause(self, lits):
+        if self.unsat:
+            return
+        self._cancel_until(0)
+        lits = list(dict.fromkeys(lits))
+        if any(-lit in lits for lit in lits):
+            return
+        clause = []
+        for lit in lits:
+            self.occurs[abs(lit)][lit < 0] += 1
+            val = self._lit_value(lit)
+            if val == 1:
+                return
+            if val == 0:
+                clause.append(lit)
+        if not clause:
+            self.unsat = True
+        elif len(clause) == 1:
+            self._assign(clause[0], None)
+            if self._propagate() is not None:
+                self.unsat = True
+        else:
+            self._attach(clause)
+
+    def solve(self, assumptions=()):
+        """True iff the clauses are satisfiable with every assumption literal
+        true. On success self.model() gives a satisfying assignment."""
+        stats = instrumentation.current
+        if stats is None:
+            return self._search(assumptions, None)
+        visits = self.visits
+        result = self._search(assumptions, stats)
+        stats.clauses += self.visits - visits
+        return result
+
+    def _search(self, assumptions, stats):
+        if self.unsat:
+            return False
+        self._cancel_until(0)
+        if self._propagate() is not None:
+            self.unsat = True
+            return False
+        assumptions = list(assumptions)
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                if self._decision_level() == 0:
+                    self.unsat = True
+                    return False
+                learnt, back_level = self._analyze(conflict)
+                self._cancel_until(back_level)
+                if len(learnt) == 1:
+                    self._assign(learnt[0], None)
+                else:
+                    self._assign(learnt[0], self._attach(learnt))
+                self.bump *= 1.05
+                continue
+
+            level = self._decision_level()
+            if level < len(assumptions):
+                lit = assumptions[level]
+                val = self._lit_value(lit)
+                if val == -1:
+                    self._cancel_until(0)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if val == 0:
+                    self._assign(lit, None)
+                continue
+
+            lit = self._pick_branch()
+            if lit is None:
+                return True
+            self.trail_lim.append(len(self.trail))
+            if stats is not None:
+                stats.depth(len(self.trail_lim))
+            self._assign(lit, None)
+
+    def model(self):
+        return {v: self.value[v] == 1 for v in range(1, self.num_vars + 1)}
+
+    def _decision_level(self):
+        return len(self.trail_lim)
+
+    def _lit_value(self, lit):
+        val = self.value[abs(lit)]
+        return val if lit > 0 else -val
+
+    def _assign(self, lit, reason):
+        v = abs(lit)
+        self.value[v] = 1 if lit > 0 else -1
+        self.level[v] = self._decision_level()
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    def _attach(self, clause):
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(index)
+        self.watches[clause[1]].append(index)
+        return index
+
+    def _propagate(self):
+        # Two watched literals: a clause is only visited when one of its two
+        # watched literals becomes false.
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+            watchers = self.watches[false_lit]
+            self.watches[false_lit] = kept = []
+            self.visits += len(watchers)
+            for k, index in enumerate(watchers):
+                clause = self.clauses[index]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self._lit_value(clause[0]) == 1:
+                    kept.append(index)
+                    continue
+                for m in range(2, len(clause)):
+                    if self._lit_value(clause[m]) != -1:
+                        clause[1], clause[m] = clause[m], clause[1]
+                        self.watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if self._lit_value(clause[0]) == -1:
+                        kept.extend(watchers[k + 1:])
+                        return index
+                    self._assign(clause[0], index)
+        return None
+
+    def _analyze(self, conflict):
+        # First unique implication point learning.
+        current = self._decision_level()
+        learnt = [None]
+        seen = set()
+        pending = 0
+        index = len(self.trail) - 1
+        clause = self.clauses[conflict]
+        while True:
+            for q in clause:
+                v = abs(q)
+                if v not in seen and self.level[v] > 0:
+                    seen.add(v)
+                    self.activity[v] += self.bump
+                    if self.level[v] == current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.clauses[self.reason[abs(lit)]]
+        learnt[0] = -lit
+        if len(learnt) == 1:
+            return learnt, 0
+        # Watch the literal from the highest remaining level second
+        best = max(range(1, len(learnt)), key=lambda i: self.level[abs(learnt[i])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, self.level[abs(learnt[1])]
+
+    def _cancel_until(self, level):
+        if self._decision_level() <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            v = abs(lit)
+            self.phase[v] = lit > 0
+            self.value[v] = 0
+            self.reason[v] = None
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def _pick_branch(self):
+        # Pure literals are decided first with their only polarity: a pure
+        # literal can never falsify a clause (learned clauses are resolvents
+        # and inherit the polarities), so this is pure-literal elimination.
+        best, best_activity = None, -1.0
+        for v in range(1, self.num_vars + 1):
+            if self.value[v] != 0:
+                continue
+            pos, neg = self.occurs[v]
+            if not pos or not neg:
+                return v if pos else -v
+            if self.activity[v] > best_activity:
+                best, best_activity = v, self.activity[v]
+        if best is None:
+            return None
+        return best if self.phase[best] else -best
+
+
+class SymbolSolver:
+    """CDCL solver over Expr clauses, mapping each Symbol to a variable."""
+    def __init__(self):
+        self.sat = CDCLSolver()
+        self.var_of = {}
+
+    def literal(self, lit):
+        if isinstance(lit, Not):
+            return -self.variable(lit.operand)
+        return self.variable(lit)
+
+    def variable(self, symbol):
+        v = self.var_of.get(symbol)
+        if v is None:
+            v = self.var_of[symbol] = self.sat.new_var()
+        return v
+
+    def add_clauses(self, clauses, guard=None):
+        for clause in clauses:
+            lits = [self.literal(lit) for lit in clause]
+            if guard is not None:
+                lits.append(-guard)
+            self.sat.add_clause(lits)
+
+    def satisfiable(self):
+        return self.sat.solve()
+
+    def entails(self, query):
+        # KB |= query iff KB & ~query is unsatisfiable. The clauses of
+        # ~query only hold while the activation literal is assumed true,
+        # and are switched off for good afterwards.
+        negated = to_cnf(Not(query))
+        if all(len(clause) == 1 for clause in negated):
+            assumptions = [self.literal(next(iter(clause))) for clause in negated]
+            return not self.sat.solve(assumptions)
+        act = self.sat.new_var()
+        self.add_clauses(negated, guard=act)
+        result = not self.sat.solve([act])
+        self.sat.add_clause([-act])
+        return result
+
+    def entails_many(self, queries):
+        # A model of the KB rules out every query it falsifies at once;
+        # only the queries true in it need their own refutation.
+        if not self.sat.solve():
+            return {q: True for q in queries}
+        model = {s: self.sat.value[v] == 1 for s, v in self.var_of.items()}
+        answers = {}
+        for q in queries:
+            if get_symbols(q) <= model.keys() and not pl_true(q, model):
+                answers[q] = False
+            else:
+                answers[q] = self.entails(q)
+        return answers
+
+
+def dpll_satisfiable(sentence):
+    solver = SymbolSolver()
+    solver.add_clauses(to_cnf(sentence))
+    return solver.satisfiable()
+
+def dpll_entails(kb, alpha):
+    return not dpll_satisfiable(And(kb, Not(alpha)))
@@ -0,0 +1,100 @@
+"""Array-backed belief map for the agents.
+
+Holds what an agent believes about each cell in one byte per cell, using
+the grid's cell codes plus UNKNOWN, so a GridView row can be copied in
+with a single slice assignment.
+"""
+from src.world.grid import EMPTY, WALL, GridView
+
+UNKNOWN = 2
+
+class BeliefMap:
+    """Beliefs about a map, read and written like the old dict of
+    {(x, y): 'Wall'/'Empty'}: cells never written are 'Unknown', i.e.
+    missing from the mapping.
+
+    The array grows to cover every cell written or merged, so it can be
+    created before the agent knows the map size."""
+    NAMES = {EMPTY: 'Empty', WALL: 'Wall'}
+    CODES = {'Empty': EMPTY, 'Wall': WALL, 'Unknown': UNKNOWN}
+
+    def __init__(self, w=0, h=0):
+        self.w, self.h = w, h
+        self.cells = bytearray([UNKNOWN]) * (w * h)
+
+    def _resize(self, w, h):
+        old, old_w = self.cells, self.w
+        cells = bytearray([UNKNOWN]) * (w * h)
+        for y in range(self.h):
+            cells[y * w:y * w + old_w] = old[y * old_w:(y + 1) * old_w]
+        self.w, self.h, self.cells = w, h, cells
+
+    def _cover(self, w, h):
+        if w > self.w or h > self.h:
+            self._resize(max(w, self.w), max(h, self.h))
+
+    def merge(self, view):
+        """Records everything in view (a GridView, or any mapping of
+        positions to 'Wall'/'Empty'). A GridView is copied row by row, with
+        a single slice assignment for every row it fully covers."""
+        if not isinstance(view, GridView):
+            for pos, cell_type in view.items():
+                self[pos] = cell_type
+            return
+        # The first view sizes the array to the whole map
+        self._cover(view.grid.w, view.grid.h)
+        x0, width = view.x0, view.width
+        full = (1 << width) - 1
+        cells = self.cells
+        for y in range(view.y0, view.y1 + 1):
+            start = y * self.w + x0
+            bits = view.row_mask(y)
+            if bits == full:
+                cells[start:start + width] = view.row(y)
+            elif bits:
+                row = view.row(y)
+                for k in range(width):
+                    if bits >> k & 1:
+                        cells[start + k] = row[k]
+
+    def code(self, x, y):
+        """The cell code at (x, y); UNKNOWN outside the array."""
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return self.cells[y * self.w + x]
+        return UNKNOWN
+
+    def is_wall(self, x, y):
+        return self.code(x, y) == WALL
+
+    def __setitem__(self, pos, cell_type):
+        x, y = pos
+        if x < 0 or y < 0:
+            raise ValueError(f"Cell out of bounds: {pos}")
+        self._cover(x + 1, y + 1)
+        self.cells[y * self.w + x] = self.CODES[cell_type]
+
+    def __getitem__(self, pos):
+        code = self.code(*pos)
+        if code == UNKNOWN:
+            raise KeyError(pos)
+        return self.NAMES[code]
+
+    def get(self, pos, default=None):
+        code = self.code(*pos)
+        return default if code == UNKNOWN else self.NAMES[code]
+
+    def __contains__(self, pos):
+        return self.code(*pos) != UNKNOWN
+
+    def items(self):
+        w = self.w
+        for i, code in enumerate(self.cells):
+            if code != UNKNOWN:
+                yield (i % w, i // w), self.NAMES[code]
+
+    def __iter__(self):
+        for pos, _ in self.items():
+            yield pos
+
+    def __len__(self):
+        return len(self.cells) - self.cells.count(UNKNOWN)
@@ -0,0 +1,348 @@
+"""Corridor/junction compression of a maze.
+
+The graph is built over the cells known to be free (EMPTY). Free cells
+with exactly two free neighbours are corridor cells; every other free cell
+is a node (junctions and dead-end tips), and so is every frontier cell, a
+free cell next to an UNKNOWN one. Each corridor, the run of corridor cells
+between two nodes, becomes one weighted edge, so the graph has a node per
+junction instead of a vertex per cell. A ring of corridor cells with no
+node on it gets one of its cells promoted to a node (an anchor).
+
+Dead-end branches are the parts of the graph outside its cycles, found by
+repeatedly pruning degree-1 nodes. Frontier nodes are never pruned, since
+the unknown beyond them may loop back. Each cell of a branch gets a depth:
+the number of steps from the mouth of its branch, where it hangs off the
+core. A component with no cycle and no frontier hangs off its busiest
+junction.
+"""
+import heapq
+
+from src.world.belief import UNKNOWN
+from src.world.grid import EMPTY
+
+class Edge:
+    __slots__ = ('u', 'v', 'cells', 'weight')
+
+    def __init__(self, u, v, cells):
+        self.u, self.v = u, v
+        self.cells = cells              # corridor cells from u to v
+        self.weight = len(cells) + 1
+
+class CorridorGraph:
+    """The corridor graph of a w x h map given by cells, one cell code
+    (EMPTY/WALL/UNKNOWN) per cell, e.g. Grid.cells or BeliefMap.cells.
+    Cells outside the map are walls.
+
+    update() re-traces only the corridors around the cells that changed;
+    the dead-end labels and path distances are recomputed on the (small)
+    graph the first time they are needed after a change."""
+    def __init__(self, w=0, h=0, cells=None):
+        self._build(w, h, bytearray(cells) if cells is not None else bytearray(w * h))
+
+    def sync(self, belief):
+        """Brings the graph up to date with a BeliefMap (or a Grid)."""
+        cells = belief.cells
+        if (belief.w, belief.h) != (self.w, self.h):
+            self._build(belief.w, belief.h, bytearray(cells))
+            return
+        # Cells whose code changed, found with one XOR over the arrays
+        diff = int.from_bytes(cells, 'little') ^ int.from_bytes(self.cells, 'little')
+        changed = {}
+        while diff:
+            low = diff & -diff
+            i = (low.bit_length() - 1) // 8
+            changed[i] = cells[i]
+            diff &= ~(0xff << (i * 8))
+        if changed:
+            self.update(changed)
+
+    # --- Structure ---------------------------------------------------------------
+
+    def _build(self, w, h, cells):
+        self.w, self.h = w, h
+        self.cells = cells
+        self.degree = bytearray(w * h)
+        self.frontier = bytearray(w * h)
+        for i in range(w * h):
+            self._classify(i)
+        self.nodes = set()
+        self.edges = {}
+        self.exits = {}             # node -> {first cell out of it: edge id}
+        self.cell_edge = {}         # corridor cell -> edge id
+        self._next_edge = 0
+        self.version = 0
+        self._labels = None
+        self._distances = {}
+        for i in range(w * h):
+            if self._is_open(i) and self._is_junction(i):
+                self._add_node(i)
+        self._retrace(range(w * h))
+
+    def _is_open(self, i):
+        return self.cells[i] == EMPTY
+
+    def _is_junction(self, i):
+        return self.degree[i] != 2 or self.frontier[i]
+
+    def _adjacent(self, i):
+        w, h = self.w, self.h
+        x, y = i % w, i // w
+        out = []
+        if y + 1 < h:
+            out.append(i + w)
+        if y > 0:
+            out.append(i - w)
+        if x + 1 < w:
+            out.append(i + 1)
+        if x > 0:
+            out.append(i - 1)
+        return out
+
+    def _open_neighbors(self, i):
+        cells = self.cells
+        return [j for j in self._adjacent(i) if cells[j] == EMPTY]
+
+    def _classify(self, i):
+        # Free-neighbour count and frontier flag of cell i
+        cells = self.cells
+        adjacent = self._adjacent(i)
+        self.degree[i] = sum(1 for j in adjacent if cells[j] == EMPTY)
+        self.frontier[i] = any(cells[j] == UNKNOWN for j in adjacent)
+
+    def _add_node(self, i):
+        self.nodes.add(i)
+        self.exits.setdefault(i, {})
+
+    def _trace(self, a, first):
+        # Walks the corridor leaving node a through cell first
+        cells = []
+        prev, cur = a, first
+        while cur not in self.nodes:
+            cells.append(cur)
+            n1, n2 = self._open_neighbors(cur)
+            prev, cur = cur, (n2 if n1 == prev else n1)
+        e = self._next_edge
+        self._next_edge += 1
+        self.edges[e] = Edge(a, cur, tuple(cells))
+        self.exits[a][first] = e
+        self.exits[cur][prev] = e
+        for c in cells:
+            self.cell_edge[c] = e
+
+    def _retrace(self, cells):
+        # Traces every missing corridor out of the nodes among cells, then
+        # anchors any ring of corridor cells left uncovered
+        for i in cells:
+            if i in self.nodes:
+                for n in self._open_neighbors(i):
+                    if n not in self.exits[i]:
+                        self._trace(i, n)
+        for i in cells:
+            if self._is_open(i) and i not in self.nodes and i not in self.cell_edge:
+                self._add_node(i)
+                self._trace(i, self._open_neighbors(i)[0])
+
+    def _remove_edge(self, e):
+        edge = self.edges.pop(e)
+        for node in (edge.u, edge.v):
+            for first, other in list(self.exits[node].items()):
+                if other == e:
+                    del self.exits[node][first]
+        for c in edge.cells:
+            del self.cell_edge[c]
+        return edge
+
+    def update(self, changes):
+        """Applies {cell index: cell code} changes, re-tracing only the
+        corridors that touch the changed cells."""
+        affected = set()
+        for i in changes:
+            affected.add(i)
+            affected.update(self._adjacent(i))
+        loose = set(affected)
+        for i in affected:
+            if i in self.nodes:
+                edge_ids = set(self.exits[i].values())
+            elif i in self.cell_edge:
+                edge_ids = {self.cell_edge[i]}
+            else:
+                edge_ids = ()
+            for e in edge_ids:
+                if e in self.edges:
+                    edge = self._remove_edge(e)
+                    loose.update((edge.u, edge.v))
+                    loose.update(edge.cells)
+        for i, code in changes.items():
+            self.cells[i] = code
+        for i in affected:
+            self._classify(i)
+            if not self._is_open(i):
+                if i in self.nodes:
+                    self.nodes.discard(i)
+                    del self.exits[i]
+            elif self._is_junction(i):
+                if i not in self.nodes:
+                    self._add_node(i)
+            elif i in self.nodes and not self.exits[i]:
+                # Became a corridor cell; it no longer needs to be a node
+                self.nodes.discard(i)
+                del self.exits[i]
+        self._retrace(loose)
+        self.version += 1
+        self._labels = None
+        self._distances = {}
+
+    # --- Dead ends -------------------------------------------------------------
+
+    def _dead_ends(self):
+        # (node depth, edge -> mouth-side endpoint) for the pruned branches
+        if self._labels is not None:
+            return self._labels
+        degree = {node: len(exits) for node, exits in self.exits.items()}
+        alive = {node: set(exits.values()) for node, exits in self.exits.items()}
+        queue = [node for node, d in degree.items() if d == 1 and not self.frontier[node]]
+        order = []
+        parent = {}
+        mouth_of = {}
+        while queue:
+            node = queue.pop()
+            if degree[node] != 1:
+                continue
+            (e,) = alive[node]
+            edge = self.edges[e]
+            other = edge.v if edge.u == node else edge.u
+            degree[node] = 0
+            order.append(node)
+            parent[node] = (other, edge.weight)
+            mouth_of[e] = other
+            alive[other].discard(e)
+            degree[other] -= 1
+            if degree[other] == 1 and not self.frontier[other]:
+                queue.append(other)
+        depth = {}
+        for node in reversed(order):
+            other, weight = parent[node]
+            depth[node] = depth.get(other, 0) + weight
+        # A component with no cycle and no frontier is pruned down to a
+        # node that depends on the pruning order; it is re-rooted at its
+        # busiest junction (lowest cell index on ties) so the labels do
+        # not depend on the order the graph was built in
+        pruned = set(order)
+        for node, d in degree.items():
+            if d == 0 and self.exits[node] and node not in pruned and not self.frontier[node]:
+                self._reroot(self._tree_root(node), depth, mouth_of)
+        self._labels = (depth, mouth_of)
+        return self._labels
+
+    def _tree_component(self, node):
+        # The nodes of the (acyclic) component of node
+        seen = {node}
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            for e in self.exits[n].values():
+                edge = self.edges[e]
+                other = edge.v if edge.u == n else edge.u
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        return seen
+
+    def _tree_root(self, node):
+        # Anchors left over from a broken ring are not junctions (degree 2)
+        return max((n for n in self._tree_component(node) if self.degree[n] != 2),
+                   key=lambda n: (self.degree[n], -n))
+
+    def _reroot(self, root, depth, mouth_of):
+        # Depths and mouths of a tree component measured from root
+        depth.pop(root, None)
+        seen = {root}
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            for e in self.exits[n].values():
+                edge = self.edges[e]
+                other = edge.v if edge.u == n else edge.u
+                if other not in seen:
+                    seen.add(other)
+                    mouth_of[e] = n
+                    depth[other] = depth.get(n, 0) + edge.weight
+                    stack.append(other)
+
+    def dead_end_depth(self, x, y):
+        """Steps from (x, y) back to the mouth of the dead-end branch it is
+        in; 0 on the core (and for cells that are not known to be free)."""
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return 0
+        i = y * self.w + x
+        depth, mouth_of = self._dead_ends()
+        if i in self.nodes:
+            return depth.get(i, 0)
+        e = self.cell_edge.get(i)
+        if e is None or e not in mouth_of:
+            return 0
+        edge = self.edges[e]
+        mouth = mouth_of[e]
+        offset = edge.cells.index(i) + 1
+        if mouth == edge.v:
+            offset = edge.weight - offset
+        return depth.get(mouth, 0) + offset
+
+    def leads_into_dead_end(self, src, dst):
+        """True if stepping from src to the neighbouring cell dst goes
+        deeper into a dead-end branch."""
+        return self.dead_end_depth(*dst) > self.dead_end_depth(*src)
+
+    # --- Distances -------------------------------------------------------------
+
+    def _attach(self, i):
+        # The nodes a cell is reached through, with the steps to each
+        if i in self.nodes:
+            return [(i, 0)]
+        e = self.cell_edge.get(i)
+        if e is None:
+            return []
+        edge = self.edges[e]
+        k = edge.cells.index(i) + 1
+        return [(edge.u, k), (edge.v, edge.weight - k)]
+
+    def _node_distances(self, target):
+        # Dijkstra over the nodes from the target cell's attachment points
+        dist = self._distances.get(target)
+        if dist is not None:
+            return dist
+        dist = {}
+        heap = [(d, node) for node, d in self._attach(target)]
+        heapq.heapify(heap)
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node in dist:
+                continue
+            dist[node] = d
+            for e in set(self.exits[node].values()):
+                edge = self.edges[e]
+                for other in (edge.u, edge.v):
+                    if other not in dist:
+                        heapq.heappush(heap, (d + edge.weight, other))
+        self._distances[target] = dist
+        return dist
+
+    def distance(self, a, b):
+        """Steps from cell a to cell b through known free cells, or None."""
+        if not all(0 <= x < self.w and 0 <= y < self.h for x, y in (a, b)):
+            return None
+        i, j = a[1] * self.w + a[0], b[1] * self.w + b[0]
+        if not (self._is_open(i) and self._is_open(j)):
+            return None
+        if i == j:
+            return 0
+        best = None
+        e = self.cell_edge.get(i)
+        if e is not None and e == self.cell_edge.get(j):
+            cells = self.edges[e].cells
+            best = abs(cells.index(i) - cells.index(j))
+        dist = self._node_distances(j)
+        for node, d in self._attach(i):
+            if node in dist and (best is None or dist[node] + d < best):
+                best = dist[node] + d
+        return best
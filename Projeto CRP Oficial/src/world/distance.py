@@ -0,0 +1,117 @@
+"""Maze (shortest-path) distances over a Grid.
+
+A flow field holds, for every cell, the number of steps to one target
+cell and the next cell on the way there, found by a single BFS from the
+target over the grid's neighbour table. Any number of agents heading for
+the same target then read their distance, or their next step, from the
+field instead of searching.
+"""
+from array import array
+from collections import OrderedDict, deque
+
+UNREACHABLE = -1
+
+# Cells of flow field a DistanceOracle keeps by default: each cell costs two
+# array('i') entries, so this is about 64 MB of fields whatever the map size
+FIELD_CELL_BUDGET = 8000000
+
+class FlowField:
+    """Distances to one target cell, and for every cell the neighbour one
+    step closer to it, both filled in by a single reverse BFS from the
+    target over the grid's neighbour table.
+
+    distances and toward are array('i') indexed like the grid cells, with
+    UNREACHABLE for walls and cells cut off from the target (toward is
+    also UNREACHABLE at the target itself)."""
+    __slots__ = ('grid', 'target', 'distances', 'toward')
+
+    def __init__(self, grid, x, y):
+        self.grid = grid
+        self.target = (x, y)
+        self.distances = distances = array('i', [UNREACHABLE]) * grid.size
+        self.toward = toward = array('i', [UNREACHABLE]) * grid.size
+        if grid.blocked(x, y):
+            return
+        neighbors = grid.neighbor_table()
+        start = y * grid.w + x
+        distances[start] = 0
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            d = distances[i] + 1
+            for j in neighbors[i]:
+                if distances[j] == UNREACHABLE:
+                    distances[j] = d
+                    toward[j] = i
+                    queue.append(j)
+
+    def distance(self, x, y):
+        """Steps from (x, y) to the target, or None if there is no path."""
+        if not self.grid.in_bounds(x, y):
+            return None
+        d = self.distances[y * self.grid.w + x]
+        return None if d == UNREACHABLE else d
+
+    def next_step(self, x, y):
+        """The neighbour of (x, y) on a shortest path to the target, or
+        None at the target or when there is no path."""
+        if not self.grid.in_bounds(x, y):
+            return None
+        j = self.toward[y * self.grid.w + x]
+        return None if j == UNREACHABLE else self.grid.coord(j)
+
+class DistanceOracle:
+    """Flow fields of a grid, computed on demand and memoized per target
+    cell.
+
+    Every field spans the whole map, so the cache is sized in cells: at
+    most budget // grid.size fields (at least one) are kept, evicting the
+    least recently used. precompute() computes the field of every free
+    cell (all-pairs distances), which suits small maps. Everything is
+    dropped when a wall changes."""
+    def __init__(self, grid, budget=FIELD_CELL_BUDGET, all_pairs=False):
+        if budget < 1:
+            raise ValueError(f"budget must be positive: {budget}")
+        self.grid = grid
+        self.capacity = max(1, budget // grid.size)
+        self.fields = OrderedDict()
+        self.version = grid.version
+        if all_pairs:
+            self.precompute()
+
+    def precompute(self):
+        """Computes the field of every free cell and keeps them all."""
+        self.capacity = max(self.capacity, self.grid.size)
+        for i in range(self.grid.size):
+            x, y = self.grid.coord(i)
+            if not self.grid.blocked(x, y):
+                self.field(x, y)
+
+    def field(self, x, y):
+        """The flow field toward (x, y), which must be on the map."""
+        if not self.grid.in_bounds(x, y):
+            raise ValueError(f"Cell out of bounds: {(x, y)}")
+        if self.version != self.grid.version:
+            self.fields.clear()
+            self.version = self.grid.version
+        key = y * self.grid.w + x
+        field = self.fields.get(key)
+        if field is None:
+            field = self.fields[key] = FlowField(self.grid, x, y)
+            if len(self.fields) > self.capacity:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(key)
+        return field
+
+    def distance(self, source, target):
+        """Steps from source to target, or None if there is no path."""
+        if not self.grid.in_bounds(*target):
+            return None
+        return self.field(*target).distance(*source)
+
+    def step_toward(self, source, target):
+        """The neighbour of source on a shortest path to target, or None."""
+        if not self.grid.in_bounds(*target):
+            return None
+        return self.field(*target).next_step(*source)
@@ -0,0 +1,265 @@
+"""Array-backed grid for the game map.
+
+Cells are stored row-major in flat bytearrays, cell (x, y) at index
+y * w + x, so single-cell queries are an index computation instead of
+building and hashing a tuple. Whole-map queries work on bitsets: Python
+ints with bit i set for cell i, combined with shifts and masks, which is
+the pure-Python stand-in for vectorized array operations.
+"""
+
+EMPTY = 0
+WALL = 1
+
+# Neighbour order used by the agents' move generation
+DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+class Grid:
+    """Cell types and pellets of a w x h map.
+
+    cells holds one cell type (EMPTY/WALL) per cell and pellet_map one 0/1
+    byte per cell. Coordinates outside the map are neither walls nor
+    pellets, but they are blocked."""
+    def __init__(self, w, h, walls=(), pellets=()):
+        if w <= 0 or h <= 0:
+            raise ValueError(f"Grid size must be positive: {w}x{h}")
+        self.w, self.h = w, h
+        self.size = w * h
+        self.cells = bytearray(self.size)
+        self.pellet_map = bytearray(self.size)
+        self.pellet_count = 0
+        for x, y in walls:
+            self.cells[self.index(x, y)] = WALL
+        for x, y in pellets:
+            self.add_pellet(x, y)
+        self._masks = None
+        self._neighbors = None
+        # Bumped whenever a wall changes, so caches built on the walls can
+        # tell they are stale
+        self.version = 0
+        # Read-only alias of cells handed out by views, so nothing is copied
+        self.readonly_cells = memoryview(self.cells).toreadonly()
+
+    @classmethod
+    def from_arrays(cls, w, h, cells, pellet_map=None):
+        """A grid with copies of the given row-major cell and pellet arrays."""
+        grid = cls(w, h)
+        if len(cells) != grid.size or (pellet_map is not None and len(pellet_map) != grid.size):
+            raise ValueError(f"Arrays do not match the grid size: {w}x{h}")
+        grid.cells[:] = cells
+        if pellet_map is not None:
+            grid.pellet_map[:] = pellet_map
+            grid.pellet_count = grid.pellet_map.count(1)
+        return grid
+
+    def index(self, x, y):
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            raise ValueError(f"Cell out of bounds: {(x, y)}")
+        return y * self.w + x
+
+    def coord(self, i):
+        return (i % self.w, i // self.w)
+
+    # --- Single-cell queries -------------------------------------------------
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def is_wall(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h and self.cells[y * self.w + x] == WALL
+
+    def blocked(self, x, y):
+        return not (0 <= x < self.w and 0 <= y < self.h) or self.cells[y * self.w + x] == WALL
+
+    def has_pellet(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h and self.pellet_map[y * self.w + x] == 1
+
+    def view(self, x, y, radius):
+        """The square window of the given radius around (x, y), clipped to
+        the map, as a GridView."""
+        return GridView(self, max(0, x - radius), max(0, y - radius),
+                        min(self.w - 1, x + radius), min(self.h - 1, y + radius))
+
+    # --- Updates ---------------------------------------------------------------
+
+    def set_wall(self, x, y, wall=True):
+        self.cells[self.index(x, y)] = WALL if wall else EMPTY
+        self._masks = None
+        self._neighbors = None
+        self.version += 1
+
+    def add_pellet(self, x, y):
+        i = self.index(x, y)
+        if not self.pellet_map[i]:
+            self.pellet_map[i] = 1
+            self.pellet_count += 1
+
+    def remove_pellet(self, x, y):
+        """Removes the pellet at (x, y); True if there was one."""
+        if not self.has_pellet(x, y):
+            return False
+        self.pellet_map[y * self.w + x] = 0
+        self.pellet_count -= 1
+        return True
+
+    # --- Bulk queries ------------------------------------------------------------
+
+    def walls(self):
+        return {self.coord(i) for i, c in enumerate(self.cells) if c == WALL}
+
+    def pellets(self):
+        return {self.coord(i) for i, p in enumerate(self.pellet_map) if p}
+
+    def neighbors(self, x, y):
+        """The free 4-neighbours of (x, y), in DIRECTIONS order."""
+        if not self.in_bounds(x, y):
+            return []
+        return [self.coord(j) for j in self.neighbor_table()[y * self.w + x]]
+
+    def neighbor_table(self):
+        """Per cell index, the tuple of indices of its free 4-neighbours.
+
+        Built once and reused until a wall changes."""
+        if self._neighbors is None:
+            w, h, cells = self.w, self.h, self.cells
+            table = []
+            for i in range(self.size):
+                x, y = i % w, i // w
+                table.append(tuple((y + dy) * w + x + dx for dx, dy in DIRECTIONS
+                                   if 0 <= x + dx < w and 0 <= y + dy < h
+                                   and cells[(y + dy) * w + x + dx] != WALL))
+            self._neighbors = table
+        return self._neighbors
+
+    def _bitsets(self):
+        # (free, not_first_column, not_last_column, full)
+        if self._masks is None:
+            w = self.w
+            full = (1 << self.size) - 1
+            first_column = full // ((1 << w) - 1)     # bit 0 of every row
+            last_column = first_column << (w - 1)
+            free = full & ~self._pack(self.cells, WALL)
+            self._masks = (free, full & ~first_column, full & ~last_column, full)
+        return self._masks
+
+    @staticmethod
+    def _pack(values, value):
+        # One '0'/'1' digit per cell, last cell first, parsed as binary
+        table = bytes(0x31 if b == value else 0x30 for b in range(256))
+        return int(values[::-1].translate(table), 2)
+
+    def free_mask(self):
+        """Bitset of the cells that are not walls."""
+        return self._bitsets()[0]
+
+    def wall_mask(self):
+        free, _, _, full = self._bitsets()
+        return full & ~free
+
+    def pellet_mask(self):
+        return self._pack(self.pellet_map, 1)
+
+    def mask_of(self, coords):
+        mask = 0
+        for x, y in coords:
+            mask |= 1 << self.index(x, y)
+        return mask
+
+    def cells_of(self, mask):
+        """The coordinates of the cells in a bitset, in index order."""
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(self.coord(low.bit_length() - 1))
+            mask ^= low
+        return out
+
+    def expand(self, mask):
+        """The free cells in mask or 4-adjacent to a cell in mask."""
+        free, not_first, not_last, full = self._bitsets()
+        w = self.w
+        grown = (mask | ((mask & not_last) << 1) | ((mask & not_first) >> 1)
+                 | (mask << w) | (mask >> w))
+        return grown & free
+
+    def flood_mask(self, x, y):
+        """Bitset of the free cells reachable from (x, y)."""
+        if self.blocked(x, y):
+            return 0
+        reached = 1 << self.index(x, y)
+        while True:
+            grown = self.expand(reached)
+            if grown == reached:
+                return reached
+            reached = grown
+
+class GridView:
+    """A read-only window onto a grid: the cells x0..x1, y0..y1 (inclusive),
+    optionally restricted to the cells set in mask.
+
+    Nothing is copied. row() returns memoryview slices of the grid storage
+    and the dict-style accessors read through to it, so a view can be used
+    like the {(x, y): 'Wall'/'Empty'} dict agents used to get. mask is a
+    bitset over the window, bit (y - y0) * width + (x - x0); None means
+    every cell of the window is in the view."""
+    __slots__ = ('grid', 'x0', 'y0', 'x1', 'y1', 'mask')
+
+    def __init__(self, grid, x0, y0, x1, y1, mask=None):
+        self.grid = grid
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.mask = mask
+
+    @property
+    def width(self):
+        return self.x1 - self.x0 + 1
+
+    def row(self, y):
+        """The cell types of row y across the window (a memoryview),
+        including cells outside the mask."""
+        start = y * self.grid.w
+        return self.grid.readonly_cells[start + self.x0:start + self.x1 + 1]
+
+    def row_mask(self, y):
+        """Bitset of the cells of row y that are in the view, bit k for x0 + k."""
+        width = self.width
+        if self.mask is None:
+            return (1 << width) - 1
+        return self.mask >> ((y - self.y0) * width) & ((1 << width) - 1)
+
+    def is_free(self, x, y):
+        return (x, y) in self and self.grid.cells[y * self.grid.w + x] != WALL
+
+    def __contains__(self, pos):
+        x, y = pos
+        if not (self.x0 <= x <= self.x1 and self.y0 <= y <= self.y1):
+            return False
+        return self.mask is None or self.mask >> ((y - self.y0) * self.width + x - self.x0) & 1 == 1
+
+    def __getitem__(self, pos):
+        if pos not in self:
+            raise KeyError(pos)
+        x, y = pos
+        return 'Wall' if self.grid.cells[y * self.grid.w + x] == WALL else 'Empty'
+
+    def get(self, pos, default=None):
+        return self[pos] if pos in self else default
+
+    def __iter__(self):
+        for pos, _ in self.items():
+            yield pos
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        cells, w = self.grid.cells, self.grid.w
+        for y in range(self.y0, self.y1 + 1):
+            bits = self.row_mask(y)
+            for x in range(self.x0, self.x1 + 1):
+                if bits & 1:
+                    yield (x, y), 'Wall' if cells[y * w + x] == WALL else 'Empty'
+                bits >>= 1
+
+    def __len__(self):
+        if self.mask is not None:
+            return self.mask.bit_count()
+        return max(0, self.width) * max(0, self.y1 - self.y0 + 1)
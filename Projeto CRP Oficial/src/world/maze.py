@@ -0,0 +1,217 @@
+"""Seeded maze generation.
+
+Every generator takes a random.Random and returns the cell types as a
+row-major bytearray (EMPTY/WALL, like Grid.cells), so a given seed always
+gives the same maze and large maps never go through sets of tuples.
+
+- random_walls: a border plus walls scattered over the interior.
+- backtracker: a perfect maze (exactly one path between any two cells)
+  carved by an iterative depth-first search over the odd cells.
+- braid: a backtracker maze with dead ends knocked through into loops.
+
+Random walls can cut regions off. Connectivity is found per row run:
+each maximal run of free cells in a row is one element of a union-find,
+joined with the runs it touches in the next row, so the work grows with
+the number of runs rather than the number of cells.
+"""
+import random
+import re
+from array import array
+from itertools import compress
+
+from src.world.grid import EMPTY, WALL, Grid
+
+START = (1, 1)
+
+_FREE_RUN = re.compile(b'\\x00+')
+
+class DisjointSet:
+    """Union-find over the integers 0..n-1, with path halving and union
+    by size."""
+    def __init__(self, n):
+        self.parent = array('i', range(n))
+        self.size = array('i', [1]) * n
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+def _check_size(w, h):
+    if w < 3 or h < 3:
+        raise ValueError(f"Maze size must be at least 3x3: {w}x{h}")
+
+# --- Generators ------------------------------------------------------------------
+
+def random_walls(w, h, rng, density=0.15):
+    """A border of walls plus int(density * interior) walls placed
+    uniformly over the interior; START is always left free."""
+    _check_size(w, h)
+    cells = bytearray([WALL]) * (w * h)
+    inner = w - 2
+    for y in range(1, h - 1):
+        cells[y * w + 1:y * w + 1 + inner] = bytes(inner)
+    count = int(density * inner * (h - 2))
+    for k in rng.sample(range(inner * (h - 2)), count) if count > 0 else ():
+        cells[(k // inner + 1) * w + k % inner + 1] = WALL
+    cells[START[1] * w + START[0]] = EMPTY
+    return cells
+
+def backtracker(w, h, rng):
+    """A perfect maze on the cells with odd coordinates, carved by a
+    randomized depth-first search from START."""
+    _check_size(w, h)
+    cells = bytearray([WALL]) * (w * h)
+    # The maze lattice, one slot per odd cell, padded with a ring of
+    # slots marked visited so no step needs a bounds check
+    cw, ch = (w - 1) // 2, (h - 1) // 2
+    lw = cw + 2
+    visited = bytearray([1]) * (lw * (ch + 2))
+    for j in range(1, ch + 1):
+        visited[j * lw + 1:j * lw + 1 + cw] = bytes(cw)
+    steps = (1, -1, lw, -lw)
+
+    def cell(slot):
+        return (2 * (slot // lw) - 1) * w + 2 * (slot % lw) - 1
+
+    start = lw + 1
+    visited[start] = 1
+    cells[cell(start)] = EMPTY
+    stack = [start]
+    randrange = rng.randrange
+    while stack:
+        slot = stack[-1]
+        options = [slot + d for d in steps if not visited[slot + d]]
+        if not options:
+            stack.pop()
+            continue
+        nxt = options[randrange(len(options))] if len(options) > 1 else options[0]
+        visited[nxt] = 1
+        a, b = cell(slot), cell(nxt)
+        cells[b] = EMPTY
+        cells[(a + b) // 2] = EMPTY
+        stack.append(nxt)
+    return cells
+
+def braid(w, h, rng, fraction=1.0):
+    """A backtracker maze where each dead end is, with probability
+    fraction, opened into a neighbouring passage (preferring another dead
+    end), turning the tree into a maze with loops."""
+    cells = backtracker(w, h, rng)
+    cw, ch = (w - 1) // 2, (h - 1) // 2
+
+    def exits(c):
+        return (cells[c + 1] == EMPTY) + (cells[c - 1] == EMPTY) \
+            + (cells[c + w] == EMPTY) + (cells[c - w] == EMPTY)
+
+    for j in range(ch):
+        for i in range(cw):
+            c = (2 * j + 1) * w + 2 * i + 1
+            if exits(c) != 1 or rng.random() >= fraction:
+                continue
+            # Walls to knock out, toward lattice cells that exist
+            options = []
+            if i + 1 < cw and cells[c + 1] == WALL:
+                options.append(1)
+            if i > 0 and cells[c - 1] == WALL:
+                options.append(-1)
+            if j + 1 < ch and cells[c + w] == WALL:
+                options.append(w)
+            if j > 0 and cells[c - w] == WALL:
+                options.append(-w)
+            if not options:
+                continue
+            dead = [d for d in options if exits(c + 2 * d) == 1]
+            options = dead or options
+            cells[c + options[rng.randrange(len(options))]] = EMPTY
+    return cells
+
+GENERATORS = {'random': random_walls, 'backtracker': backtracker, 'braid': braid}
+
+# --- Connectivity ----------------------------------------------------------------
+
+def free_runs(cells, w, h):
+    """Per row, the (start, end) column ranges of its maximal runs of
+    free cells."""
+    return [[m.span() for m in _FREE_RUN.finditer(cells, y * w, (y + 1) * w)]
+            for y in range(h)]
+
+def reachable(cells, w, h, x, y):
+    """A bytearray with 1 for every free cell reachable from (x, y) and 0
+    elsewhere."""
+    reach = bytearray(w * h)
+    if not (0 <= x < w and 0 <= y < h) or cells[y * w + x] == WALL:
+        return reach
+    runs = free_runs(cells, w, h)
+    first = [0]
+    for row in runs:
+        first.append(first[-1] + len(row))
+    sets = DisjointSet(first[-1])
+    # Join each run with the runs of the next row sharing a column
+    for row in range(h - 1):
+        upper, lower = runs[row], runs[row + 1]
+        a = b = 0
+        while a < len(upper) and b < len(lower):
+            s1, e1 = upper[a]
+            s2, e2 = lower[b]
+            if s1 < e2 - w and s2 - w < e1:
+                sets.union(first[row] + a, first[row + 1] + b)
+            if e1 <= e2 - w:
+                a += 1
+            else:
+                b += 1
+    start = y * w + x
+    root = next(sets.find(first[y] + k) for k, (s, e) in enumerate(runs[y]) if s <= start < e)
+    ones = b'\x01' * w
+    for row in range(h):
+        for k, (s, e) in enumerate(runs[row]):
+            if sets.find(first[row] + k) == root:
+                reach[s:e] = ones[:e - s]
+    return reach
+
+# --- Pellets and whole mazes -----------------------------------------------------
+
+def place_pellets(reach, rng, density=0.15, exclude=()):
+    """A pellet map (one 0/1 byte per cell) with max(1, int(density * n))
+    pellets sampled from the n cells set in reach, minus exclude."""
+    if exclude:
+        reach = bytearray(reach)
+        for i in exclude:
+            reach[i] = 0
+    spots = list(compress(range(len(reach)), reach))
+    pellet_map = bytearray(len(reach))
+    for i in rng.sample(spots, min(len(spots), max(1, int(density * len(spots))))):
+        pellet_map[i] = 1
+    return pellet_map
+
+def build_maze(w, h, style='random', seed=None, wall_density=0.15,
+               pellet_density=0.15, braid_fraction=1.0):
+    """A Grid with walls from the named generator and pellets on the free
+    cells reachable from START, and START itself.
+
+    The same seed (any value random.Random accepts) gives the same maze;
+    None seeds from the system."""
+    if style not in GENERATORS:
+        raise ValueError(f"Unknown maze style: {style}")
+    rng = random.Random(seed)
+    if style == 'random':
+        cells = random_walls(w, h, rng, wall_density)
+        reach = reachable(cells, w, h, *START)
+    else:
+        cells = backtracker(w, h, rng) if style == 'backtracker' else braid(w, h, rng, braid_fraction)
+        # Carved mazes are connected by construction
+        reach = cells.translate(bytes([1, 0]) + bytes(254))
+    pellet_map = place_pellets(reach, rng, pellet_density, exclude=(START[1] * w + START[0],))
+    return Grid.from_arrays(w, h, cells, pellet_map), START
@@ -0,0 +1,103 @@
+"""Line-of-sight visibility over a Grid.
+
+The field of view of a cell is computed with recursive shadowcasting and
+kept as a bitset over the cell's (clipped) square window, so a window of
+radius 4 needs at most 81 bits. VisibilityTable computes each cell's field
+of view the first time it is asked for and keeps it until a wall changes;
+after that, building a view or testing whether one cell sees another is a
+lookup.
+"""
+from src.world.grid import WALL, GridView
+
+# (xx, xy, yx, yy) per octant: maps the octant-local (col, row) to a map offset
+_OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
+
+def shadowcast(grid, x, y, radius):
+    """The cells within the square of the given radius around (x, y) that
+    are visible from it, as a bitset over grid.view(x, y, radius).
+
+    Walls stop sight but are themselves visible; cells outside the map
+    block like walls."""
+    window = grid.view(x, y, radius)
+    if not grid.in_bounds(x, y):
+        return 0
+    width = window.width
+    visible = 1 << ((y - window.y0) * width + x - window.x0)
+    for octant in _OCTANTS:
+        visible |= _cast(grid, window, x, y, radius, 1, 1.0, 0.0, octant)
+    return visible
+
+def _cast(grid, window, cx, cy, radius, row, start, end, octant):
+    # Scans the octant rows from row outwards between the slopes start
+    # and end (start > end), recursing below every wall run that narrows
+    # the lit sector.
+    if start < end:
+        return 0
+    xx, xy, yx, yy = octant
+    cells, w, h = grid.cells, grid.w, grid.h
+    width = window.width
+    visible = 0
+    new_start = start
+    for j in range(row, radius + 1):
+        blocked = False
+        for i in range(j, -1, -1):
+            # The cell at column i of row j, its slopes measured from the
+            # origin to its two corners
+            left, right = (i + 0.5) / (j - 0.5), (i - 0.5) / (j + 0.5)
+            if right > start:
+                continue
+            if left < end:
+                break
+            mx, my = cx + i * xx + j * xy, cy + i * yx + j * yy
+            inside = 0 <= mx < w and 0 <= my < h
+            opaque = not inside or cells[my * w + mx] == WALL
+            if inside:
+                visible |= 1 << ((my - window.y0) * width + mx - window.x0)
+            if blocked:
+                if opaque:
+                    new_start = right
+                    continue
+                blocked = False
+                start = new_start
+            elif opaque and j < radius:
+                blocked = True
+                visible |= _cast(grid, window, cx, cy, radius, j + 1, start, left, octant)
+                new_start = right
+        if blocked:
+            break
+    return visible
+
+class VisibilityTable:
+    """Fields of view of every cell of a grid for one view radius, each
+    computed on first use and cached until the grid's walls change."""
+    def __init__(self, grid, radius):
+        self.grid = grid
+        self.radius = radius
+        self._reset()
+
+    def _reset(self):
+        self.fov = [None] * self.grid.size
+        self.version = self.grid.version
+
+    def mask(self, x, y):
+        """The field of view of (x, y): a bitset over its view window."""
+        if self.version != self.grid.version:
+            self._reset()
+        i = y * self.grid.w + x
+        mask = self.fov[i]
+        if mask is None:
+            mask = self.fov[i] = shadowcast(self.grid, x, y, self.radius)
+        return mask
+
+    def view(self, x, y):
+        """The cells visible from (x, y), as a masked GridView."""
+        window = self.grid.view(x, y, self.radius)
+        window.mask = self.mask(x, y)
+        return window
+
+    def sees(self, x, y, tx, ty):
+        """True if (tx, ty) is visible from (x, y)."""
+        return (tx, ty) in self.view(x, y)
@@ -0,0 +1,52 @@
+"""Regression checks for CorridorGraph: a graph updated cell by cell must
+match one built from scratch on the same map.
+
+Run from the project root:
+    python -m pytest tests
+"""
+import random
+from collections import deque
+
+from src.world.belief import UNKNOWN
+from src.world.corridors import CorridorGraph
+from src.world.grid import EMPTY
+from src.world.maze import build_maze
+
+def bfs_distances(cells, w, h, start):
+    dist = {start: 0}
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        x, y = i % w, i // w
+        for j, ok in ((i + 1, x + 1 < w), (i - 1, x > 0), (i + w, y + 1 < h), (i - w, y > 0)):
+            if ok and cells[j] == EMPTY and j not in dist:
+                dist[j] = dist[i] + 1
+                queue.append(j)
+    return dist
+
+def test_incremental_matches_fresh():
+    rng = random.Random(7)
+    for seed in range(30):
+        style = ('random', 'backtracker', 'braid')[seed % 3]
+        w, h = rng.choice([(9, 7), (11, 9), (15, 11)])
+        grid, _ = build_maze(w, h, style=style, seed=seed)
+        # Reveal the map in random chunks, as a ghost exploring it would
+        belief = bytearray([UNKNOWN]) * (w * h)
+        graph = CorridorGraph(w, h, belief)
+        order = list(range(w * h))
+        rng.shuffle(order)
+        chunk = rng.randint(1, 8)
+        for k in range(0, len(order), chunk):
+            changes = {i: grid.cells[i] for i in order[k:k + chunk]}
+            for i, code in changes.items():
+                belief[i] = code
+            graph.update(changes)
+            fresh = CorridorGraph(w, h, belief)
+            cells = [(i % w, i // w) for i in range(w * h)]
+            assert [graph.dead_end_depth(*c) for c in cells] == \
+                [fresh.dead_end_depth(*c) for c in cells], (style, seed, k)
+            free = [i for i in range(w * h) if belief[i] == EMPTY]
+            for a in rng.sample(free, min(3, len(free))):
+                dist = bfs_distances(belief, w, h, a)
+                for b in rng.sample(free, min(5, len(free))):
+                    assert graph.distance(cells[b], cells[a]) == dist.get(b)
@@ -0,0 +1,12 @@
+import pytest
+
+from src.world.distance import DistanceOracle
+from src.world.grid import Grid
+
+def test_field_rejects_off_map_targets():
+    oracle = DistanceOracle(Grid(30, 20))
+    # (31, 1) would alias cell (1, 2) if it were keyed by index
+    with pytest.raises(ValueError):
+        oracle.field(31, 1)
+    assert oracle.distance((1, 2), (31, 1)) is None
+    assert oracle.field(1, 2).distance(1, 2) == 0
@@ -0,0 +1,78 @@
+"""Regression checks for the propositional engines: every method must
+agree with the reference truth-table checker, tt_entails.
+
+Run from the project root:
+    python -m pytest tests
+"""
+import copy
+import pickle
+import random
+
+from src.logic.propositional import (PropositionalKB, Symbol, Not, And, Or,
+                                     Implication, tt_entails)
+
+SYMBOLS = [Symbol(name) for name in 'ABCDE']
+
+def random_sentence(rng, depth=2):
+    if depth == 0 or rng.random() < 0.3:
+        s = rng.choice(SYMBOLS)
+        return Not(s) if rng.random() < 0.3 else s
+    kind = rng.randrange(4)
+    if kind == 0:
+        return Not(random_sentence(rng, depth - 1))
+    if kind == 3:
+        return Implication(random_sentence(rng, depth - 1), random_sentence(rng, depth - 1))
+    operands = [random_sentence(rng, depth - 1) for _ in range(rng.randint(2, 3))]
+    return And(*operands) if kind == 1 else Or(*operands)
+
+def random_kbs(seed, count=60):
+    rng = random.Random(seed)
+    for _ in range(count):
+        sentences = [random_sentence(rng) for _ in range(rng.randint(1, 4))]
+        queries = [random_sentence(rng) for _ in range(4)] + SYMBOLS
+        yield sentences, queries
+
+def check_method(method, seed):
+    for sentences, queries in random_kbs(seed):
+        kb = PropositionalKB(method)
+        for s in sentences:
+            kb.tell(s)
+        expected = {q: tt_entails(And(*sentences), q) for q in queries}
+        assert kb.ask_many(queries) == expected, (method, sentences)
+
+def test_compiled_matches_tt():
+    check_method('compiled', 1)
+
+def test_copy_and_pickle_keep_nodes_interned():
+    a, b = Symbol('A'), Symbol('B')
+    sentence = Implication(And(a, Not(b)), Or(b, a))
+    assert copy.copy(sentence) is sentence
+    assert copy.deepcopy(sentence) is sentence
+    assert pickle.loads(pickle.dumps(sentence)) is sentence
+
+def test_cdcl_matches_tt():
+    check_method('dpll', 2)
+
+def test_vector_matches_tt():
+    check_method('vector', 3)
+
+def test_bdd_matches_tt():
+    check_method('bdd', 4)
+
+def test_bdd_with_changing_facts_matches_tt():
+    # The rules are compiled once and conditioned on the facts, which are
+    # set, replaced and retracted between queries
+    rng = random.Random(11)
+    for _ in range(40):
+        kb = PropositionalKB('bdd')
+        for _ in range(12):
+            r = rng.random()
+            if r < 0.2:
+                kb.tell(random_sentence(rng))
+            elif r < 0.8:
+                kb.set_fact(f"f{rng.randint(0, 3)}", random_sentence(rng, rng.choice([0, 0, 1])))
+            else:
+                kb.retract_fact(f"f{rng.randint(0, 3)}")
+            queries = [random_sentence(rng) for _ in range(3)]
+            expected = {q: tt_entails(And(*kb.clauses), q) for q in queries}
+            assert kb.ask_many(queries) == expected